@@ -1,10 +1,16 @@
 import customtkinter as ctk
 import tkinter as tk
 from tkinter import messagebox
-import re
 from cfg_parser import CFGParser
+from grammar import EPSILON
 from custom_scrolled_text import CustomScrolledText
-from tree_visualizer import TreeVisualizer
+from parse_worker import ParseWorker
+from instrumentation import PhaseStats
+# tree_visualizer and batch_panel are imported when their tabs are first shown
+
+# How the explanation names the parts of a date
+PART_NAMES = {'M': 'Month', 'D': 'Day', 'Y': 'Year'}
+
 
 class App:
     def __init__(self, root):
@@ -18,8 +24,16 @@ class App:
         self.center_x = int((self.screen_width / 2) - (self.window_width / 2))
         self.center_y = int((self.screen_height / 2) - (self.window_height / 2))
         self.root.geometry(f"{self.window_width}x{self.window_height}+{self.center_x}+{self.center_y}")
-        # Declare the parser in app
-        self.parser = CFGParser()
+        # Phase timings shared by the parser and both tree canvases (off until toggled)
+        self.stats = PhaseStats()
+        self.stats_poll_id = None
+        # Declare the parser in app (repeated inputs are served from its cache)
+        self.parser = CFGParser(cache_size=256, stats=self.stats)
+        # Parsing runs on a background thread; typing re-validates after a
+        # short pause and only the newest result is shown
+        self.debounce_ms = 250
+        self.debounce_id = None
+        self.worker = ParseWorker(self.parser, self.on_worker_result)
         
         # Configure the grid layout
         self.root.grid_rowconfigure(0, weight=1)
@@ -41,16 +55,9 @@ class App:
         
         grammar_label = ctk.CTkLabel(grammar_frame, text="Grammar Definition", font=ctk.CTkFont(size=14, weight="bold"))
         grammar_label.grid(row=0, column=0, sticky="n", padx=5, pady=5)
-        # Updated CFG
-        grammar_text = """S -> M/D/Y | M-D-Y | M.D.Y
-                M -> 0X | 1V
-                D -> 0X | 1N | 2N | 3Z
-                Y -> NNNN
-                N -> 0 | 1 | 2 | 3 | 4 | 5 | 6 | 7 | 8 | 9
-                X -> 1 | 2 | 3 | 4 | 5 | 6 | 7 | 8 | 9
-                V -> 0 | 1 | 2
-                Z -> 0 | 1"""
-                
+        # Rendered from the grammar file the parser was loaded from
+        grammar_text = self.parser.definition.format()
+        
         grammar_display = ctk.CTkTextbox(grammar_frame, wrap="word", width=500, height=200, font=ctk.CTkFont(size=16))
         grammar_display.configure(font=ctk.CTkFont(size=16))
         grammar_display.grid(row=1, column=0, sticky="ew", padx=5, pady=5)
@@ -69,6 +76,7 @@ class App:
         
         # Input field
         self.input_var = tk.StringVar()
+        self.input_var.trace_add('write', self.on_input_changed)
         input_entry = ctk.CTkEntry(input_frame, textvariable=self.input_var, width=300)
         input_entry.grid(row=1, column=0, padx=5, pady=5, sticky="ew")
         
@@ -76,6 +84,12 @@ class App:
         process_button = ctk.CTkButton(input_frame, text="Process Input", command=self.process_input)
         process_button.grid(row=2, column=0, padx=5, pady=5)
         
+        # Live timing panel
+        self.stats_switch = ctk.CTkSwitch(input_frame, text="Show timings", command=self.toggle_stats)
+        self.stats_switch.grid(row=3, column=0, padx=5, pady=(5, 0))
+        self.stats_label = ctk.CTkLabel(input_frame, text="", justify="left", font=("Courier", 12))
+        self.stats_label.grid(row=4, column=0, sticky="w", padx=5, pady=(0, 5))
+        
         # Results frame with tabs
         results_frame = ctk.CTkFrame(main_frame)
         results_frame.grid(row=3, column=0, sticky="nsew", padx=10, pady=5)
@@ -86,7 +100,7 @@ class App:
         results_label.grid(row=0, column=0, sticky="n", padx=5, pady=5)
         
         # Tabview for results
-        self.tab_view = ctk.CTkTabview(results_frame)
+        self.tab_view = ctk.CTkTabview(results_frame, command=self.on_tab_changed)
         self.tab_view.grid(row=1, column=0, sticky="nsew", padx=5, pady=5)
         self.tab_view.grid_columnconfigure(0, weight=1)
         self.tab_view.grid_rowconfigure(0, weight=1)
@@ -96,27 +110,56 @@ class App:
         self.leftmost_tab = self.tab_view.add("Leftmost Derivation")
         self.rightmost_tab = self.tab_view.add("Rightmost Derivation")
         self.trees_tab = self.tab_view.add("Parse Trees")
+        self.batch_tab = self.tab_view.add("Batch")
         
-        # Configure tabs grid            
+        # Only the validation tab is filled in up front; the other tabs (and
+        # their text widgets, canvases and scrollbars) are built the first
+        # time they are shown
         self.validation_tab.grid_columnconfigure(0, weight=1)
+        self.validation_result = CustomScrolledText(self.validation_tab, wrap=tk.WORD, font=("Courier", 14))
+        self.validation_result.grid(row=0, column=0, sticky="nsew", padx=5, pady=5)
+        
+        self.tab_builders = {
+            "Leftmost Derivation": self.build_leftmost_tab,
+            "Rightmost Derivation": self.build_rightmost_tab,
+            "Parse Trees": self.build_trees_tab,
+            "Batch": self.build_batch_tab,
+        }
+        self.built_tabs = {"Validation"}
+        self.last_result = None  # (input_string, derivation) last shown
+    
+    def on_tab_changed(self):
+        self.ensure_tab(self.tab_view.get())
+    
+    def ensure_tab(self, name):
+        """Build a tab on first use and fill it with the last result"""
+        if name in self.built_tabs:
+            return
+        self.built_tabs.add(name)
+        self.tab_builders[name]()
+        self.render_tab(name)
+    
+    def build_leftmost_tab(self):
         self.leftmost_tab.grid_columnconfigure(0, weight=1)
+        # Derivation logs are capped so very long derivations cannot grow the Tk buffer without limit
+        self.leftmost_result = CustomScrolledText(self.leftmost_tab, max_lines=10000, wrap=tk.WORD, font=("Courier", 14))
+        self.leftmost_result.grid(row=0, column=0, sticky="nsew", padx=5, pady=5)
+        self.leftmost_result.configure(state='disabled')
+    
+    def build_rightmost_tab(self):
         self.rightmost_tab.grid_columnconfigure(0, weight=1)
+        self.rightmost_result = CustomScrolledText(self.rightmost_tab, max_lines=10000, wrap=tk.WORD, font=("Courier", 14))
+        self.rightmost_result.grid(row=0, column=0, sticky="nsew", padx=5, pady=5)
+        self.rightmost_result.configure(state='disabled')
+    
+    def build_trees_tab(self):
+        from tree_visualizer import TreeVisualizer
         
         # Special configuration for trees tab
         self.trees_tab.grid_columnconfigure(0, weight=1)
         self.trees_tab.grid_rowconfigure(0, weight=1)
         self.trees_tab.grid_rowconfigure(1, weight=1)
         
-        # Text widgets for each tab
-        self.validation_result = CustomScrolledText(self.validation_tab, wrap=tk.WORD, font=("Courier", 14))
-        self.validation_result.grid(row=0, column=0, sticky="nsew", padx=5, pady=5)
-        
-        self.leftmost_result = CustomScrolledText(self.leftmost_tab, wrap=tk.WORD, font=("Courier", 14))
-        self.leftmost_result.grid(row=0, column=0, sticky="nsew", padx=5, pady=5)
-        
-        self.rightmost_result = CustomScrolledText(self.rightmost_tab, wrap=tk.WORD, font=("Courier", 14))
-        self.rightmost_result.grid(row=0, column=0, sticky="nsew", padx=5, pady=5)
-        
         # Create frames for parse trees
         self.leftmost_tree_frame = ctk.CTkFrame(self.trees_tab)
         self.leftmost_tree_frame.grid(row=0, column=0, sticky="nsew", padx=5, pady=5)
@@ -183,6 +226,49 @@ class App:
         self.leftmost_tree_scroll_y.configure(command=self.leftmost_tree_canvas.yview)
         self.rightmost_tree_scroll_x.configure(command=self.rightmost_tree_canvas.xview)
         self.rightmost_tree_scroll_y.configure(command=self.rightmost_tree_canvas.yview)
+        self.leftmost_tree_canvas.stats = self.stats
+        self.rightmost_tree_canvas.stats = self.stats
+        self.leftmost_tree_canvas.symbol_kinds = self.parser.symbol_kinds
+        self.rightmost_tree_canvas.symbol_kinds = self.parser.symbol_kinds
+    
+    def build_batch_tab(self):
+        from batch_panel import BatchPanel
+        
+        self.batch_tab.grid_columnconfigure(0, weight=1)
+        self.batch_tab.grid_rowconfigure(0, weight=1)
+        
+        # Batch panel: clicking a row derives that entry through the normal input path
+        self.batch_panel = BatchPanel(self.batch_tab, on_select=self.show_batch_entry,
+                                      grammar=self.parser.definition)
+        self.batch_panel.grid(row=0, column=0, sticky="nsew", padx=5, pady=5)
+    
+    def toggle_stats(self):
+        # Stop the running refresh loop so toggling never starts a second one
+        if self.stats_poll_id is not None:
+            self.root.after_cancel(self.stats_poll_id)
+            self.stats_poll_id = None
+        self.stats.enabled = bool(self.stats_switch.get())
+        if self.stats.enabled:
+            self.stats.reset()
+            self.update_stats_panel()
+        else:
+            self.stats_label.configure(text="")
+    
+    def update_stats_panel(self):
+        self.stats_poll_id = None
+        if not self.stats.enabled:
+            return
+        lines = [f"{'phase':<11}{'count':>7}{'mean ms':>10}{'p90 ms':>10}"]
+        for phase, summary in self.stats.snapshot().items():
+            lines.append(f"{phase:<11}{summary['count']:>7}{summary['mean_ms']:>10.3f}{summary['p90_ms']:>10.3f}")
+        self.stats_label.configure(text="\n".join(lines))
+        self.stats_poll_id = self.root.after(500, self.update_stats_panel)
+    
+    def show_batch_entry(self, input_string):
+        self.input_var.set(input_string)
+        self.process_input()
+        self.tab_view.set("Parse Trees")
+        self.ensure_tab("Parse Trees")
     
     def process_input(self):
         input_string = self.input_var.get().strip()
@@ -191,80 +277,118 @@ class App:
             messagebox.showerror("Error", "Please enter an input string")
             return
         
-        # Validate input
-        is_valid = self.parser.validate_input(input_string)
+        # Skip the debounce delay and parse right away
+        if self.debounce_id is not None:
+            self.root.after_cancel(self.debounce_id)
+            self.debounce_id = None
+        self.worker.submit(input_string)
+    
+    def on_input_changed(self, *args):
+        # Restart the debounce timer on every keystroke
+        if self.debounce_id is not None:
+            self.root.after_cancel(self.debounce_id)
+            self.debounce_id = None
+        if not self.input_var.get().strip():
+            self.worker.cancel()
+            return
+        self.debounce_id = self.root.after(self.debounce_ms, self.submit_current_input)
+    
+    def submit_current_input(self):
+        self.debounce_id = None
+        input_string = self.input_var.get().strip()
+        if input_string:
+            self.worker.submit(input_string)
+    
+    def on_worker_result(self, generation, input_string, derivation):
+        # Called on the worker thread: hand the result over to the Tk thread
+        self.root.after(0, self.show_result, generation, input_string, derivation)
+    
+    def show_result(self, generation, input_string, derivation):
+        # A newer input was submitted after this one was parsed
+        if not self.worker.is_current(generation):
+            return
+        is_valid = derivation.valid
+        self.last_result = (input_string, derivation)
         
         # Clear previous results
         self.validation_result.configure(state='normal')
         self.validation_result.delete(1.0, tk.END)
-        self.leftmost_result.configure(state='normal')
-        self.leftmost_result.delete(1.0, tk.END)
-        self.rightmost_result.configure(state='normal')
-        self.rightmost_result.delete(1.0, tk.END)
         
-        # Show validation result
+        # Show validation result (each block goes to Tk in a single insert)
+        lines = []
         if is_valid:
-            self.validation_result.insert(tk.END, f"✓ The input '{input_string}' is valid according to the grammar.\n\n")
-            self.validation_result.insert(tk.END, "Explanation:\n")
-            
-            # Determine separator type
-            separator = None
-            if '/' in input_string:
-                separator = '/'
-                self.validation_result.insert(tk.END, f"S -> M/D/Y (using '/' separator)\n")
-            elif '-' in input_string:
-                separator = '-'
-                self.validation_result.insert(tk.END, f"S -> M-D-Y (using '-' separator)\n")
-            else:  # '.' in input_string
-                separator = '.'
-                self.validation_result.insert(tk.END, f"S -> M.D.Y (using '.' separator)\n")
-            
-            # individually check the input and separate via the separator
-            parts = re.split(r'[-/.]', input_string)
-            month, day, year = parts
-            
-            self.validation_result.insert(tk.END, f"Month part ({month}):\n")
-            if month[0] == '0':
-                self.validation_result.insert(tk.END, f"  M -> 0X where X = {month[1]}\n")
-            else:
-                self.validation_result.insert(tk.END, f"  M -> 1V where V = {month[1]}\n")
-            
-            self.validation_result.insert(tk.END, f"Day part ({day}):\n")
-            if day[0] == '0':
-                self.validation_result.insert(tk.END, f"  D -> 0X where X = {day[1]}\n")
-            elif day[0] in '12':
-                self.validation_result.insert(tk.END, f"  D -> {day[0]}N where N = {day[1]}\n")
-            else:
-                self.validation_result.insert(tk.END, f"  D -> 3Z where Z = {day[1]}\n")
-            
-            self.validation_result.insert(tk.END, f"Year part ({year}):\n")
-            self.validation_result.insert(tk.END, f"  Y -> NNNN where N = {year[0]}, {year[1]}, {year[2]}, {year[3]}\n")
-            
-            # Generate derivations and trees
-            leftmost_steps, leftmost_tree = self.parser.leftmost_derivation(input_string)
-            rightmost_steps, rightmost_tree = self.parser.rightmost_derivation(input_string)
-            
-            # Display leftmost derivation
-            for i, step in enumerate(leftmost_steps):
-                self.leftmost_result.insert(tk.END, f"Step {i+1}: {step}\n")
-            
-            # Display rightmost derivation
-            for i, step in enumerate(rightmost_steps):
-                self.rightmost_result.insert(tk.END, f"Step {i+1}: {step}\n")
-            
-            # Display visual parse trees
-            self.leftmost_tree_canvas.draw_tree(leftmost_tree)
-            self.rightmost_tree_canvas.draw_tree(rightmost_tree)
+            lines.append(f"✓ The input '{input_string}' is valid according to the grammar.\n")
+            lines.append("Explanation:")
             
+            lines.extend(self.explain(derivation.tree))
         else:
-            self.validation_result.insert(tk.END, f"✗ The input '{input_string}' is NOT valid according to the grammar.\n\n")
-            self.validation_result.insert(tk.END, "The input should match the pattern:\n")
-            self.validation_result.insert(tk.END, "MM/DD/YYYY or MM-DD-YYYY or MM.DD.YYYY where:\n")
-            self.validation_result.insert(tk.END, "- MM is 01-12 or 00-09\n")
-            self.validation_result.insert(tk.END, "- DD is 01-31 or 00-09 or 20-29 or 30-31\n")
-            self.validation_result.insert(tk.END, "- YYYY is any four-digit number\n")
+            lines.append(f"✗ The input '{input_string}' is NOT valid according to the grammar.\n")
+            lines.append("The input should match the pattern:")
+            lines.append("MM/DD/YYYY or MM-DD-YYYY or MM.DD.YYYY where:")
+            lines.append("- MM is 01-12 or 00-09")
+            lines.append("- DD is 01-31 or 00-09 or 20-29 or 30-31")
+            lines.append("- YYYY is any four-digit number")
+        self.validation_result.append_lines(lines)
         
         # Make result read-only
         self.validation_result.configure(state='disabled')
-        self.leftmost_result.configure(state='disabled')
-        self.rightmost_result.configure(state='disabled')   
\ No newline at end of file
+        
+        # Tabs that have not been built yet pick the result up when first shown
+        for name in ("Leftmost Derivation", "Rightmost Derivation", "Parse Trees"):
+            if name in self.built_tabs:
+                self.render_tab(name)
+    
+    def explain(self, tree):
+        """Describe the productions the parser chose, read off the parse tree"""
+        is_non_terminal = self.parser.is_non_terminal
+        
+        def text(node):
+            # The input characters derived from node
+            parts = []
+            stack = [node]
+            while stack:
+                current = stack.pop()
+                if is_non_terminal(current.symbol):
+                    stack.extend(reversed(current.children))
+                else:
+                    parts.append(current.value)
+            return ''.join(parts)
+        
+        def rule(node):
+            return f"{node.value} -> " + (''.join(child.value for child in node.children) or EPSILON)
+        
+        separators = {child.value for child in tree.children if not is_non_terminal(child.symbol)}
+        lines = [rule(tree) + (f" (using '{separators.pop()}' separator)" if len(separators) == 1 else "")]
+        for part in tree.children:
+            if not is_non_terminal(part.symbol):
+                continue
+            lines.append(f"{PART_NAMES.get(part.value, part.value)} part ({text(part)}):")
+            values = {}
+            for child in part.children:
+                if is_non_terminal(child.symbol):
+                    values.setdefault(child.value, []).append(text(child))
+            where = "; ".join(f"{symbol} = {', '.join(texts)}" for symbol, texts in values.items())
+            lines.append(f"  {rule(part)} where {where}" if where else f"  {rule(part)}")
+        return lines
+    
+    def render_tab(self, name):
+        """Show the last result in one of the lazily built tabs"""
+        if self.last_result is None:
+            return
+        input_string, derivation = self.last_result
+        
+        # Steps were built by the worker; invalid input just clears the log
+        if name == "Leftmost Derivation":
+            self.show_steps(self.leftmost_result, derivation.leftmost if derivation.valid else ())
+        elif name == "Rightmost Derivation":
+            self.show_steps(self.rightmost_result, derivation.rightmost if derivation.valid else ())
+        elif name == "Parse Trees" and derivation.valid:
+            # Both derivations and the tree come from the same parse
+            self.leftmost_tree_canvas.draw_tree(derivation.tree)
+            self.rightmost_tree_canvas.draw_tree(derivation.tree)
+    
+    def show_steps(self, widget, steps):
+        widget.configure(state='normal')
+        widget.delete(1.0, tk.END)
+        widget.append_lines(f"Step {i+1}: {step}" for i, step in enumerate(steps))
+        widget.configure(state='disabled')
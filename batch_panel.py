@@ -0,0 +1,196 @@
+import os
+import threading
+from array import array
+from tkinter import filedialog
+import tkinter as tk
+import customtkinter as ctk
+from cfg_parser import CFGParser
+
+
+class BatchResults:
+    """Validation results of a file: one offset and one flag per line, text read on demand"""
+
+    def __init__(self, path):
+        self.path = path
+        self.offsets = array('Q')  # byte offset of every line
+        self.flags = bytearray()   # 1 = valid, 0 = invalid
+        self.valid = 0
+        self.done = False
+        self.total_bytes = 0
+        self.read_bytes = 0
+        self._file = open(path, 'rb')
+
+    def __len__(self):
+        return len(self.flags)
+
+    def line(self, row):
+        """Text of the given row, read back from the file"""
+        self._file.seek(self.offsets[row])
+        return self._file.readline().decode('utf-8', errors='replace').strip()
+
+    def close(self):
+        self._file.close()
+
+
+class VirtualList(tk.Frame):
+    """Scrollable list that only ever has widgets for the rows in view"""
+
+    def __init__(self, master, row_count=0, get_row=None, on_click=None, row_height=22, **kwargs):
+        super().__init__(master, **kwargs)
+        self.grid_rowconfigure(0, weight=1)
+        self.grid_columnconfigure(0, weight=1)
+        self.row_height = row_height
+        self.row_count = row_count
+        self.get_row = get_row      # get_row(index) -> (text, color)
+        self.on_click = on_click    # on_click(index)
+        self.top = 0                # first row shown
+        self.row_items = []         # one text item per visible slot
+
+        self.canvas = tk.Canvas(self, bg="#f0f0f0", highlightthickness=0)
+        self.canvas.grid(row=0, column=0, sticky="nsew")
+        self.scrollbar = ctk.CTkScrollbar(self, orientation="vertical", command=self.on_scroll)
+        self.scrollbar.grid(row=0, column=1, sticky="ns")
+
+        self.canvas.bind("<Configure>", lambda event: self.refresh())
+        self.canvas.bind("<Button-1>", self.on_button)
+        self.canvas.bind("<MouseWheel>", lambda event: self.scroll_to(self.top - event.delta // 120 * 3))
+        self.canvas.bind("<Button-4>", lambda event: self.scroll_to(self.top - 3))
+        self.canvas.bind("<Button-5>", lambda event: self.scroll_to(self.top + 3))
+
+    def visible_rows(self):
+        return max(1, self.canvas.winfo_height() // self.row_height)
+
+    def set_row_count(self, row_count):
+        self.row_count = row_count
+        self.refresh()
+
+    def scroll_to(self, top):
+        self.top = max(0, min(top, self.row_count - self.visible_rows()))
+        self.refresh()
+
+    def on_scroll(self, action, amount, unit=None):
+        # Scrollbar protocol: ("moveto", fraction) or ("scroll", n, "units"/"pages")
+        if action == "moveto":
+            self.scroll_to(int(float(amount) * self.row_count))
+        elif action == "scroll":
+            step = self.visible_rows() if unit == "pages" else 1
+            self.scroll_to(self.top + int(amount) * step)
+
+    def on_button(self, event):
+        row = self.top + event.y // self.row_height
+        if self.on_click is not None and row < self.row_count:
+            self.on_click(row)
+
+    def refresh(self):
+        """Reuse the fixed pool of text items for the rows now in view"""
+        slots = self.visible_rows()
+        while len(self.row_items) < slots:
+            y = len(self.row_items) * self.row_height + self.row_height // 2
+            self.row_items.append(self.canvas.create_text(6, y, anchor="w", font=("Courier", 12)))
+        while len(self.row_items) > slots:
+            self.canvas.delete(self.row_items.pop())
+
+        self.top = max(0, min(self.top, self.row_count - slots))
+        for slot, item in enumerate(self.row_items):
+            row = self.top + slot
+            if row < self.row_count and self.get_row is not None:
+                text, color = self.get_row(row)
+                self.canvas.itemconfigure(item, text=text, fill=color)
+            else:
+                self.canvas.itemconfigure(item, text="")
+
+        if self.row_count:
+            self.scrollbar.set(self.top / self.row_count, min(1.0, (self.top + slots) / self.row_count))
+        else:
+            self.scrollbar.set(0.0, 1.0)
+
+
+class BatchPanel(ctk.CTkFrame):
+    """Load a file of inputs, validate it in the background and browse the results"""
+
+    def __init__(self, master, on_select=None, grammar=None, **kwargs):
+        super().__init__(master, **kwargs)
+        self.on_select = on_select  # on_select(input_string) when a row is clicked
+        self.grammar = grammar      # grammar file or Grammar the rows are validated against
+        self.results = None
+        self.poll_id = None  # pending poll_progress call
+        self.grid_columnconfigure(1, weight=1)
+        self.grid_rowconfigure(2, weight=1)
+
+        ctk.CTkButton(self, text="Load File...", command=self.load_file).grid(row=0, column=0, padx=5, pady=5)
+        self.status = ctk.CTkLabel(self, text="No file loaded")
+        self.status.grid(row=0, column=1, sticky="w", padx=5, pady=5)
+        self.progress = ctk.CTkProgressBar(self)
+        self.progress.grid(row=1, column=0, columnspan=2, sticky="ew", padx=5, pady=5)
+        self.progress.set(0)
+
+        self.list = VirtualList(self, get_row=self.get_row, on_click=self.select_row)
+        self.list.grid(row=2, column=0, columnspan=2, sticky="nsew", padx=5, pady=5)
+
+    def load_file(self):
+        path = filedialog.askopenfilename(title="Open a file with one input per line")
+        if not path:
+            return
+        if self.results is not None:
+            # Stop the reader of the previous file
+            self.results.done = True
+            self.results.close()
+        if self.poll_id is not None:
+            # One polling loop at a time, following the new results
+            self.after_cancel(self.poll_id)
+            self.poll_id = None
+        self.results = BatchResults(path)
+        self.list.top = 0
+        self.list.set_row_count(0)
+        threading.Thread(target=self.validate_file, args=(self.results,), daemon=True).start()
+        self.poll_progress()
+
+    def validate_file(self, results):
+        # Runs on a background thread with its own parser
+        # done is set however this ends, or the panel would poll forever
+        try:
+            parser = CFGParser(grammar=self.grammar)
+            results.total_bytes = os.path.getsize(results.path)
+            offset = 0
+            with open(results.path, 'rb') as file:
+                for raw in file:
+                    if results.done:
+                        return
+                    line = raw.decode('utf-8', errors='replace').strip()
+                    if line:
+                        is_valid = parser.validate_input(line)
+                        results.offsets.append(offset)
+                        results.flags.append(1 if is_valid else 0)
+                        results.valid += is_valid
+                    offset += len(raw)
+                    results.read_bytes = offset
+        finally:
+            results.done = True
+
+    def poll_progress(self):
+        # The Tk thread samples the counters instead of being sent every line
+        self.poll_id = None
+        results = self.results
+        if results is None:
+            return
+        # Read done before the counts: if it is set, every row is already in
+        done = results.done
+        if results.total_bytes:
+            self.progress.set(results.read_bytes / results.total_bytes)
+        rows = len(results)
+        self.status.configure(text=f"{rows:,} lines, {results.valid:,} valid, {rows - results.valid:,} invalid"
+                                   + ("" if done else " (validating...)"))
+        self.list.set_row_count(rows)
+        if not done:
+            self.poll_id = self.after(100, self.poll_progress)
+        else:
+            self.progress.set(1)
+
+    def get_row(self, row):
+        is_valid = self.results.flags[row]
+        text = f"{row + 1:>9}  {'✓' if is_valid else '✗'}  {self.results.line(row)}"
+        return text, '#27ae60' if is_valid else '#c0392b'
+
+    def select_row(self, row):
+        if self.on_select is not None:
+            self.on_select(self.results.line(row))
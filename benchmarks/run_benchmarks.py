@@ -0,0 +1,185 @@
+"""Benchmarks for the parser, derivation and tree layout hot paths.
+
+Runs headless (no Tk window), writes the results as JSON and compares them
+against a stored baseline:
+
+    python benchmarks/run_benchmarks.py --size 20000 --output results.json
+    python benchmarks/run_benchmarks.py --update-baseline
+
+The exit status is 1 when any benchmark is slower than the baseline by more
+than --threshold (a fraction, 0.25 = 25%).
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from cfg_parser import CFGParser
+from node import Node
+from tree_layout import LayoutCache, compute_layout
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_BASELINE = os.path.join(REPO_ROOT, 'benchmarks', 'baseline.json')
+
+# Imported in a fresh interpreter; fails if the headless core pulls in the GUI stack
+CORE_IMPORT = (
+    "import sys, cfg_parser, cli, parallel, scanner, tree_layout, parse_worker\n"
+    "gui = sorted(m for m in ('tkinter', 'customtkinter') if m in sys.modules)\n"
+    "sys.exit('parser core imports ' + ', '.join(gui) if gui else 0)\n"
+)
+
+
+def generate_corpora(parser, size, seed=0):
+    """Return (valid, invalid) lists of `size` strings each, reproducible from seed"""
+    rng = random.Random(seed)
+    digits = '0123456789'
+    valid = []
+    invalid = []
+    while len(valid) < size or len(invalid) < size:
+        separator = rng.choice('/-.')
+        # Date-shaped candidates, kept or rejected by the parser itself
+        candidate = (rng.choice('01') + rng.choice(digits) + separator + rng.choice('0123') + rng.choice(digits)
+                     + rng.choice([separator, rng.choice('/-.')]) + ''.join(rng.choice(digits) for _ in range(4)))
+        if parser.validate_input(candidate):
+            if len(valid) < size:
+                valid.append(candidate)
+        elif len(invalid) < size:
+            invalid.append(candidate)
+    return valid, invalid
+
+
+def wide_tree(node_count, seed=0):
+    """A random tree of node_count nodes for the layout benchmark"""
+    rng = random.Random(seed)
+    root = Node('S')
+    nodes = [root]
+    for i in range(node_count - 1):
+        parent = nodes[rng.randrange(max(0, len(nodes) - 64), len(nodes))]
+        nodes.append(parent.add_child(Node(str(i % 10))))
+    return root
+
+
+def import_core():
+    subprocess.run([sys.executable, '-c', CORE_IMPORT], cwd=REPO_ROOT, check=True)
+
+
+def measure(function, operations, repeat):
+    """Best wall time of `repeat` runs of function()"""
+    best = float('inf')
+    for _ in range(repeat):
+        started = time.perf_counter()
+        function()
+        best = min(best, time.perf_counter() - started)
+    return {'seconds': best, 'operations': operations, 'per_op_us': best / operations * 1e6}
+
+
+def derive_and_layout(parser, inputs):
+    # What the GUI does per input: derive, then lay the tree out for the
+    # leftmost and the rightmost canvas
+    layouts = LayoutCache()
+    for text in inputs:
+        tree = parser.derive(text).tree
+        layouts.layout(tree)
+        layouts.layout(tree)
+
+
+def run(size, repeat):
+    parser = CFGParser()
+    valid, invalid = generate_corpora(parser, size)
+    derivation_inputs = valid[:max(1, size // 10)]
+    date_tree = parser.derive(valid[0]).tree
+    big_tree = wide_tree(10000)
+    layout_count = max(1, size // 100)
+    rng = random.Random(0)
+
+    benchmarks = {
+        'validate_input_valid': (lambda: [parser.validate_input(s) for s in valid], len(valid)),
+        'validate_input_invalid': (lambda: [parser.validate_input(s) for s in invalid], len(invalid)),
+        'leftmost_derivation': (lambda: [parser.leftmost_derivation(s) for s in derivation_inputs],
+                                len(derivation_inputs)),
+        'rightmost_derivation': (lambda: [parser.rightmost_derivation(s) for s in derivation_inputs],
+                                 len(derivation_inputs)),
+        'layout_date_tree': (lambda: [compute_layout(date_tree) for _ in range(layout_count)], layout_count),
+        'layout_10k_nodes': (lambda: compute_layout(big_tree), 1),
+        'layout_both_views': (lambda: derive_and_layout(parser, derivation_inputs),
+                              len(derivation_inputs)),
+        'import_parser_core': (import_core, 1),
+        'sample': (lambda: [parser.sample(rng=rng) for _ in range(size)], size),
+    }
+    try:
+        import numpy  # noqa: F401 -- validate_many needs it
+        mixed = valid + invalid
+        benchmarks['validate_many'] = (lambda: parser.validate_many(mixed), len(mixed))
+        benchmarks['sample_many'] = (lambda: parser.sample_many(size * 10, seed=0), size * 10)
+    except ImportError:
+        pass
+
+    results = {}
+    for name, (function, operations) in benchmarks.items():
+        results[name] = measure(function, operations, repeat)
+        print(f"{name:<24} {results[name]['per_op_us']:>12.3f} us/op", file=sys.stderr)
+    return {
+        'meta': {
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'size': size,
+            'repeat': repeat,
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        },
+        'results': results,
+    }
+
+
+def compare(current, baseline, threshold):
+    """Return the names of benchmarks slower than baseline by more than threshold"""
+    regressions = []
+    for name, result in current['results'].items():
+        reference = baseline.get('results', {}).get(name)
+        if reference is None:
+            print(f"{name:<24} (no baseline)", file=sys.stderr)
+            continue
+        ratio = result['per_op_us'] / reference['per_op_us']
+        status = 'REGRESSION' if ratio > 1 + threshold else 'ok'
+        if status != 'ok':
+            regressions.append(name)
+        print(f"{name:<24} {ratio:>7.2f}x baseline  {status}", file=sys.stderr)
+    return regressions
+
+
+def main(argv=None):
+    arg_parser = argparse.ArgumentParser(description="Benchmark the CFG parser and tree layout.")
+    arg_parser.add_argument('--size', type=int, default=20000, help="strings per generated corpus")
+    arg_parser.add_argument('--repeat', type=int, default=5, help="runs per benchmark (best is kept)")
+    arg_parser.add_argument('--output', help="write the results to this JSON file")
+    arg_parser.add_argument('--baseline', default=DEFAULT_BASELINE, help="baseline JSON to compare against")
+    arg_parser.add_argument('--threshold', type=float, default=0.25,
+                            help="allowed slowdown before a benchmark counts as a regression")
+    arg_parser.add_argument('--update-baseline', action='store_true', help="store these results as the baseline")
+    args = arg_parser.parse_args(argv)
+
+    current = run(args.size, args.repeat)
+    if args.output:
+        with open(args.output, 'w') as file:
+            json.dump(current, file, indent=2)
+
+    if args.update_baseline:
+        with open(args.baseline, 'w') as file:
+            json.dump(current, file, indent=2)
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print(f"No baseline at {args.baseline}; run with --update-baseline to create one", file=sys.stderr)
+        return 0
+    with open(args.baseline) as file:
+        baseline = json.load(file)
+    return 1 if compare(current, baseline, args.threshold) else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
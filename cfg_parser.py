@@ -1,324 +1,799 @@
-import re
-from node import Node
+from collections import namedtuple
+from node import Node, TreeTable
+from derivation_cache import DerivationCache
+from instrumentation import PhaseStats
+from grammar import CACHE_DIR, Grammar, load_grammar, load_tables, store_tables
+from language import Language
+from sppf import ParseForest
+from symbols import NON_TERMINAL, TERMINAL, intern, labels, lookup, text
+
+# Lookahead symbol of the LL(1) table at the end of the input; terminals are
+# never empty, so it cannot clash with one
+END = ''
+
+# One derivation step: the non-terminal at index `position` of the current
+# sentential form (counted in symbols) is replaced by the symbols of
+# `production`. Symbols are interned IDs (see symbols.py)
+DerivationStep = namedtuple('DerivationStep', ['index', 'position', 'nonterminal', 'production'])
+
+
+def sentential_forms(start_symbol, steps):
+    """Lazily materialize the sentential form after each step (start form first)
+    
+    start_symbol and the steps hold symbol IDs; the forms are strings.
+    """
+    form = [start_symbol]
+    yield text(form)
+    for step in steps:
+        form[step.position:step.position + 1] = step.production
+        yield text(form)
+
+
+class Derivation:
+    """Result of CFGParser.derive: validity and parse tree, with lazily produced steps
+    
+    Results may be cached and handed to many callers, so they are read-only
+    once built (the tree is frozen and materialized forms are tuples).
+    """
+    __slots__ = ('valid', 'tree', '_parser', '_forms')
+    
+    def __init__(self, valid, tree=None, parser=None):
+        object.__setattr__(self, 'valid', valid)
+        object.__setattr__(self, 'tree', tree)
+        object.__setattr__(self, '_parser', parser)
+        object.__setattr__(self, '_forms', {})
+    
+    def __setattr__(self, name, value):
+        raise AttributeError("derivation results are read-only")
+    
+    def __delattr__(self, name):
+        raise AttributeError("derivation results are read-only")
+    
+    def steps(self, order='leftmost'):
+        """Yield the DerivationStep records of the given order ('leftmost' or 'rightmost')"""
+        if not self.valid:
+            raise ValueError("an invalid input has no derivation")
+        return self._parser.derivation_steps(self.tree, order)
+    
+    def forms(self, order='leftmost'):
+        """Yield the sentential forms of the given order one at a time"""
+        if not self.valid:
+            raise ValueError("an invalid input has no derivation")
+        return sentential_forms(self.tree.symbol, self.steps(order))
+    
+    @property
+    def leftmost(self):
+        return self._materialized('leftmost')
+    
+    @property
+    def rightmost(self):
+        return self._materialized('rightmost')
+    
+    def _materialized(self, order):
+        # All forms of one order as a tuple, built on first request only
+        if not self.valid:
+            return None
+        if order not in self._forms:
+            with self._parser.stats.timer('derivation'):
+                self._forms[order] = tuple(self.forms(order))
+        return self._forms[order]
 
 class CFGParser:
-    def __init__(self):
-        # Define the grammar
-        self.grammar = {
-            'S': [['M', '/', 'D', '/', 'Y'], ['M', '-', 'D', '-', 'Y'], ['M', '.', 'D', '.', 'Y']],
-            'M': [['0', 'X'], ['1', 'V']],
-            'D': [['0', 'X'], ['1', 'N'], ['2', 'N'], ['3', 'Z']],
-            'Y': [['N', 'N', 'N', 'N']],
-            'N': [['0'], ['1'], ['2'], ['3'], ['4'], ['5'], ['6'], ['7'], ['8'], ['9']],
-            'X': [['1'], ['2'], ['3'], ['4'], ['5'], ['6'], ['7'], ['8'], ['9']],
-            'V': [['0'], ['1'], ['2']],
-            'Z': [['0'], ['1']]
-        }
-        
-        # Define terminals and non-terminals
-        self.terminals = set()
-        self.non_terminals = set(self.grammar.keys())
-        
+    def __init__(self, cache_size=0, stats=None, grammar=None, cache_dir=CACHE_DIR):
+        # The grammar comes from a .bnf/.json file (the bundled date grammar by
+        # default) or an already loaded Grammar
+        if not isinstance(grammar, Grammar):
+            grammar = load_grammar(grammar)
+        self.definition = grammar
+        # Productions are immutable tuples of labels
+        self.grammar = {lhs: tuple(tuple(production) for production in productions)
+                        for lhs, productions in grammar.rules.items()}
+        self.start_symbol = grammar.start
+        
+        # Symbol sets and the compiled recognizer are cached on disk under a
+        # hash of the grammar text, so only the first start analyses it
+        tables = load_tables(grammar, cache_dir) if cache_dir else None
+        if tables is None:
+            tables = self._analyze()
+            if cache_dir:
+                store_tables(grammar, tables, cache_dir)
+        
+        self.terminals = set(tables['terminals'])
+        self.non_terminals = set(tables['non_terminals'])
+        self.nullable = set(tables['nullable'])
+        self.first = {symbol: frozenset(first) for symbol, first in tables['first'].items()}
+        self.follow = {symbol: frozenset(follow) for symbol, follow in tables['follow'].items()}
+        # Non-terminals with A =>+ A, which give some inputs infinitely many trees
+        self.cyclic = set(tables['cyclic'])
+        # Non-terminals with A =>+ A..., which predictive parsing cannot handle
+        self.left_recursive = set(tables['left_recursive'])
+        # LL(1) table: ll1_table[A][lookahead] lists the indices of the
+        # productions of A that can apply; END is the end of the input
+        self.ll1_table = tables['ll1']
+        self.ll1_conflicts = [(symbol, lookahead, indices)
+                              for symbol, row in self.ll1_table.items()
+                              for lookahead, indices in row.items() if len(indices) > 1]
+        # Predictive derivation needs every expansion to make progress;
+        # other grammars are derived from the Earley chart
+        self.predictive = not self.left_recursive and not self.cyclic
+        # Terminals that can start at each character, for multi-character lookahead
+        self._single_char = all(len(terminal) == 1 for terminal in self.terminals)
+        self._terminals_by_char = {}
+        for terminal in sorted(self.terminals, key=len, reverse=True):
+            self._terminals_by_char.setdefault(terminal[0], []).append(terminal)
+        # DFA transition table; None for recursive grammars, which are not
+        # regular and are validated by the chart parser
+        self.transitions = tables['transitions']
+        self.accepting = frozenset(tables['accepting'])
+        
+        # Interned copies of the tables for the hot paths: rules maps a
+        # non-terminal ID to its productions as tuples of IDs, and
+        # symbol_kinds[ID] is TERMINAL, NON_TERMINAL or 0 (not in this grammar)
+        self.start_id = intern(self.start_symbol)
+        self.rules = {intern(lhs): tuple(tuple(map(intern, production)) for production in productions)
+                      for lhs, productions in self.grammar.items()}
+        self.symbol_kinds = bytearray(len(labels))
+        for terminal in self.terminals:
+            self.symbol_kinds[intern(terminal)] = TERMINAL
+        for symbol in self.rules:
+            self.symbol_kinds[symbol] = NON_TERMINAL
+        self._ll1 = {intern(symbol): {lookahead: tuple(indices) for lookahead, indices in row.items()}
+                     for symbol, row in self.ll1_table.items()}
+        # Productions reversed, ready to be pushed onto the prediction stack
+        self._pushed = {symbol: tuple(production[::-1] for production in productions)
+                        for symbol, productions in self.rules.items()}
+        self._array_tables = None
+        self._language = None  # Language tables, built on first count/sample
+        
+        # derive() returns frozen trees built through this table, so equal
+        # trees (and subtrees) are one shared object
+        self.trees = TreeTable()
+        
+        # Optional LRU cache of derive() results, keyed by input string
+        self.cache = DerivationCache(cache_size) if cache_size else None
+        
+        # Per-phase timings (validate, parse, tree, derivation); off by default
+        self.stats = stats if stats is not None else PhaseStats()
+    
+    def _analyze(self):
+        """Everything derived from the grammar, in the JSON-friendly form that is cached"""
+        terminals = set()
         for productions in self.grammar.values():
             for production in productions:
                 for symbol in production:
                     if symbol not in self.grammar:
-                        self.terminals.add(symbol)
+                        terminals.add(symbol)
+        
+        self.nullable = self._nullable_symbols()
+        first = self._first_sets()
+        follow = self._follow_sets(first)
+        try:
+            transitions, accepting = self._compile_recognizer()
+        except ValueError:
+            transitions, accepting = None, frozenset()
+        
+        return {
+            'terminals': sorted(terminals),
+            'non_terminals': list(self.grammar),
+            'nullable': sorted(self.nullable),
+            'first': {symbol: sorted(symbols) for symbol, symbols in first.items()},
+            'follow': {symbol: sorted(symbols) for symbol, symbols in follow.items()},
+            'cyclic': sorted(self._cyclic_symbols()),
+            'left_recursive': sorted(self._left_recursive_symbols()),
+            'll1': self._ll1_table(first, follow),
+            'transitions': transitions,
+            'accepting': sorted(accepting),
+        }
+    
+    def symbol_kind(self, symbol):
+        """TERMINAL, NON_TERMINAL or 0 for a symbol ID or label"""
+        if symbol.__class__ is not int:
+            symbol = lookup(symbol)
+            if symbol is None:
+                return 0
+        # IDs interned after this parser was built belong to other grammars
+        kinds = self.symbol_kinds
+        return kinds[symbol] if symbol < len(kinds) else 0
     
     def is_terminal(self, symbol):
-        return symbol in self.terminals
+        return self.symbol_kind(symbol) == TERMINAL
     
     def is_non_terminal(self, symbol):
-        return symbol in self.non_terminals
+        return self.symbol_kind(symbol) == NON_TERMINAL
     
     def get_productions(self, symbol):
-        return self.grammar.get(symbol, [])
+        return self.grammar.get(symbol, ())
+    
+    def _nullable_symbols(self):
+        nullable = set()
+        changed = True
+        while changed:
+            changed = False
+            for symbol, productions in self.grammar.items():
+                if symbol not in nullable and any(all(part in nullable for part in production)
+                                                  for production in productions):
+                    nullable.add(symbol)
+                    changed = True
+        return nullable
+    
+    def _first_sets(self):
+        """FIRST set of every non-terminal: the terminals its strings can start with"""
+        first = {symbol: set() for symbol in self.grammar}
+        changed = True
+        while changed:
+            changed = False
+            for symbol, productions in self.grammar.items():
+                before = len(first[symbol])
+                for production in productions:
+                    for part in production:
+                        if part not in self.grammar:
+                            first[symbol].add(part)
+                            break
+                        first[symbol] |= first[part]
+                        if part not in self.nullable:
+                            break
+                changed |= len(first[symbol]) != before
+        return first
+    
+    def _first_of(self, symbols, first):
+        """(FIRST set of a symbol sequence, whether the whole sequence is nullable)"""
+        result = set()
+        for symbol in symbols:
+            if symbol not in self.grammar:
+                result.add(symbol)
+                return result, False
+            result |= first[symbol]
+            if symbol not in self.nullable:
+                return result, False
+        return result, True
+    
+    def _follow_sets(self, first):
+        """FOLLOW set of every non-terminal: what can come right after it (END for the end of input)"""
+        follow = {symbol: set() for symbol in self.grammar}
+        follow[self.start_symbol].add(END)
+        changed = True
+        while changed:
+            changed = False
+            for symbol, productions in self.grammar.items():
+                for production in productions:
+                    for k, part in enumerate(production):
+                        if part not in self.grammar:
+                            continue
+                        before = len(follow[part])
+                        rest, rest_nullable = self._first_of(production[k + 1:], first)
+                        follow[part] |= rest
+                        if rest_nullable:
+                            follow[part] |= follow[symbol]
+                        changed |= len(follow[part]) != before
+        return follow
+    
+    def _ll1_table(self, first, follow):
+        """{A: {lookahead: [production indices]}}; a cell with several indices is a conflict"""
+        table = {}
+        for symbol, productions in self.grammar.items():
+            row = table[symbol] = {}
+            for index, production in enumerate(productions):
+                lookaheads, nullable = self._first_of(production, first)
+                if nullable:
+                    lookaheads |= follow[symbol]
+                for lookahead in sorted(lookaheads):
+                    row.setdefault(lookahead, []).append(index)
+        return table
+    
+    def _left_recursive_symbols(self):
+        """Non-terminals A with A =>+ A... (possibly after nullable symbols)"""
+        corner = {symbol: set() for symbol in self.grammar}
+        for symbol, productions in self.grammar.items():
+            for production in productions:
+                for part in production:
+                    if part not in self.grammar:
+                        break
+                    corner[symbol].add(part)
+                    if part not in self.nullable:
+                        break
+        return {symbol for symbol in self.grammar if symbol in self._reachable(corner, symbol)}
+    
+    def _reachable(self, edges, symbol):
+        reached = set()
+        pending = list(edges[symbol])
+        while pending:
+            current = pending.pop()
+            if current not in reached:
+                reached.add(current)
+                pending.extend(edges[current])
+        return reached
+    
+    def _cyclic_symbols(self):
+        """Non-terminals A with A =>+ A"""
+        # A reaches B in one step when some production of A is B surrounded
+        # only by nullable symbols
+        unit = {symbol: set() for symbol in self.grammar}
+        for symbol, productions in self.grammar.items():
+            for production in productions:
+                for k, part in enumerate(production):
+                    if part in self.grammar and all(other in self.nullable
+                                                    for other in production[:k] + production[k + 1:]):
+                        unit[symbol].add(part)
+        return {symbol for symbol in self.grammar if symbol in self._reachable(unit, symbol)}
+    
+    def _compile_recognizer(self):
+        """Compile self.grammar into a DFA (transitions, accepting states)"""
+        # NFA states are list indices: eps[s] holds the epsilon moves of
+        # state s and moves[s] holds its (character, target) moves
+        eps = []
+        moves = []
+        
+        def new_state():
+            eps.append([])
+            moves.append([])
+            return len(eps) - 1
+        
+        def build(symbol, start, expanding):
+            # Wire a fragment matching `symbol` from `start`, return its end state
+            if symbol not in self.grammar:
+                state = start
+                for char in symbol:
+                    target = new_state()
+                    moves[state].append((char, target))
+                    state = target
+                return state
+            
+            # Non-terminals are inlined, which only terminates (and the
+            # language is only regular) when the grammar has no recursion
+            if symbol in expanding:
+                raise ValueError(f"Grammar is recursive through '{symbol}'; "
+                                 "it cannot be compiled into a DFA")
+            expanding.add(symbol)
+            end = new_state()
+            for production in self.grammar[symbol]:
+                state = new_state()
+                eps[start].append(state)
+                for part in production:
+                    state = build(part, state, expanding)
+                eps[state].append(end)
+            expanding.discard(symbol)
+            return end
+        
+        nfa_start = new_state()
+        nfa_accept = build(self.start_symbol, nfa_start, set())
+        
+        def closure(states):
+            stack = list(states)
+            seen = set(states)
+            while stack:
+                for target in eps[stack.pop()]:
+                    if target not in seen:
+                        seen.add(target)
+                        stack.append(target)
+            return frozenset(seen)
+        
+        # Subset construction: every reachable set of NFA states is one DFA state
+        start_set = closure([nfa_start])
+        index = {start_set: 0}
+        pending = [start_set]
+        transitions = []
+        accepting = set()
+        while pending:
+            current = pending.pop()
+            state_id = index[current]
+            while len(transitions) <= state_id:
+                transitions.append({})
+            if nfa_accept in current:
+                accepting.add(state_id)
+            
+            targets = {}
+            for state in current:
+                for char, target in moves[state]:
+                    targets.setdefault(char, []).append(target)
+            
+            for char, states in targets.items():
+                next_set = closure(states)
+                if next_set not in index:
+                    index[next_set] = len(index)
+                    pending.append(next_set)
+                transitions[state_id][char] = index[next_set]
+        
+        return self._minimize(transitions, accepting)
+    
+    def _minimize(self, transitions, accepting):
+        """Merge equivalent DFA states (Moore partition refinement)"""
+        block = [1 if state in accepting else 0 for state in range(len(transitions))]
+        block_count = len(set(block))
+        while True:
+            signatures = {}
+            new_block = []
+            for state, row in enumerate(transitions):
+                signature = (block[state], tuple(sorted((char, block[target]) for char, target in row.items())))
+                new_block.append(signatures.setdefault(signature, len(signatures)))
+            block = new_block
+            if len(signatures) == block_count:
+                break
+            block_count = len(signatures)
+        
+        # Renumber the blocks so that the start state stays 0
+        order = {block[0]: 0}
+        for state in range(len(transitions)):
+            order.setdefault(block[state], len(order))
+        
+        minimized = [None] * len(order)
+        for state, row in enumerate(transitions):
+            new_state = order[block[state]]
+            if minimized[new_state] is None:
+                minimized[new_state] = {char: order[block[target]] for char, target in row.items()}
+        
+        return minimized, frozenset(order[block[state]] for state in accepting)
     
     def validate_input(self, input_string):
-        # Check if input matches the pattern defined by the grammar
-        pattern = r'^[0-9][1-9][-/.][0-3][0-9][-/.][0-9]{4}$'
-        if not re.match(pattern, input_string):
-            return False
-        
-        # Ensure both separators are the same
-        separators = re.findall(r'[-/.]', input_string)
-        if len(separators) != 2 or separators[0] != separators[1]:
-            return False
-        
-        # Extract parts of the date string
-        parts = re.split(r'[-/.]', input_string)
-        if len(parts) != 3:
-            return False
-        
-        month, day, year = parts
-        
-        # Check M (first part)
-        if not (month[0] == '0' and month[1] in '123456789') and not (month[0] == '1' and month[1] in '012'):
-            return False
-        
-        # Check D (second part)
-        if day[0] == '0' and day[1] not in '123456789':
-            return False
-        if day[0] == '1' and not day[1].isdigit():
-            return False
-        if day[0] == '2' and not day[1].isdigit():
-            return False
-        if day[0] == '3' and day[1] not in '01':
-            return False
-        
-        # If all checks pass, the input is valid
-        return True
+        if self.stats.enabled:
+            with self.stats.timer('validate'):
+                return self._recognize(input_string)
+        return self._recognize(input_string)
+    
+    def _recognize(self, input_string):
+        if self.transitions is None:
+            # Only the chart is needed for a yes/no answer
+            _, ends = self._earley(input_string)
+            return len(input_string) in ends.get((self.start_symbol, 0), ())
+        
+        # Single pass over the input through the compiled transition table;
+        # a missing entry is the dead state
+        transitions = self.transitions
+        state = 0
+        for char in input_string:
+            state = transitions[state].get(char)
+            if state is None:
+                return False
+        return state in self.accepting
+    
+    def _array_table(self):
+        """The DFA as numpy arrays: (table, accepting mask), built on first use"""
+        if self._array_tables is None:
+            import numpy as np
+            # Rows are states plus one absorbing dead state; columns are the
+            # 256 byte / Latin-1 code points plus one catch-all column for
+            # every character beyond them
+            dead = len(self.transitions)
+            table = np.full((dead + 1, 257), dead, dtype=np.intp)
+            for state, row in enumerate(self.transitions):
+                for char, target in row.items():
+                    table[state, ord(char)] = target
+            accepting = np.zeros(dead + 1, dtype=bool)
+            accepting[list(self.accepting)] = True
+            self._array_tables = table, accepting
+        return self._array_tables
+    
+    def _fixed_length(self):
+        """Length shared by every accepted string, or None if it varies"""
+        depth = {0: 0}
+        pending = [0]
+        while pending:
+            state = pending.pop()
+            for target in self.transitions[state].values():
+                if target not in depth:
+                    depth[target] = depth[state] + 1
+                    pending.append(target)
+                elif depth[target] != depth[state] + 1:
+                    return None
+        lengths = {depth[state] for state in self.accepting}
+        return lengths.pop() if len(lengths) == 1 else None
+    
+    def validate_many(self, batch, width=None, stride=None):
+        """Validate a whole batch at once and return a numpy boolean mask
+
+        batch is either a sequence of strings or a bytes-like buffer of
+        fixed-width records, `width` bytes each and `stride` bytes apart
+        (e.g. stride=11 for newline-terminated 10-character dates). Each
+        record gives the same answer as validate_input(record.decode('latin-1')).
+        """
+        import numpy as np
+        
+        is_buffer = isinstance(batch, (bytes, bytearray, memoryview))
+        if not is_buffer:
+            batch = list(batch)
+        
+        # The vectorized path needs a DFA over single-byte/Latin-1 symbols;
+        # anything else goes through the scalar recognizer
+        if self.transitions is None or any(len(t) != 1 or ord(t) > 255 for t in self.terminals):
+            if is_buffer:
+                if not width and self.transitions is not None:
+                    width = self._fixed_length()
+                if not width:
+                    raise ValueError("width is required when the grammar's strings vary in length")
+                stride = stride or width
+                data = bytes(batch)
+                batch = [data[k:k + width].decode('latin-1')
+                         for k in range(0, len(data) - width + 1, stride)]
+            return np.fromiter(map(self.validate_input, batch), dtype=bool, count=len(batch))
+        
+        table, accepting = self._array_table()
+        if is_buffer:
+            width = width or self._fixed_length()
+            if width is None:
+                raise ValueError("width is required when the grammar's strings vary in length")
+            stride = stride or width
+            data = np.frombuffer(batch, dtype=np.uint8)
+            count = (len(data) - width) // stride + 1 if len(data) >= width else 0
+            columns = np.lib.stride_tricks.as_strided(data, shape=(count, width), strides=(stride, 1),
+                                                      writeable=False)
+            lengths = None
+        else:
+            count = len(batch)
+            if count == 0:
+                return np.zeros(0, dtype=bool)
+            lengths = np.fromiter(map(len, batch), dtype=np.intp, count=count)
+            width = max(int(lengths.max()), 1)
+            # UCS-4 code points, one column per character, clamped to the
+            # catch-all column; a batch of equal-length strings needs no masking
+            codes = np.array(batch, dtype=f'<U{width}').view(np.uint32).reshape(count, width)
+            columns = np.minimum(codes, 256)
+            if lengths.min() == width:
+                lengths = None
+        
+        # Advance every record through the transition table one column at a time
+        states = np.zeros(count, dtype=np.intp)
+        for column in range(width):
+            next_states = table[states, columns[:, column]]
+            if lengths is None:
+                states = next_states
+            else:
+                states = np.where(column < lengths, next_states, states)
+        return accepting[states]
+    
+    def parse_forest(self, input_string):
+        """Build the shared packed parse forest (see sppf.ParseForest), or None if invalid
+
+        The forest is binarized, so its size stays polynomial for any
+        grammar and it can count, rank and extract every parse tree.
+        """
+        seen, ends = self._earley(input_string)
+        if len(input_string) not in ends.get((self.start_symbol, 0), ()):
+            return None
+        return ParseForest(self, input_string, seen, ends)
+    
+    def _earley(self, input_string):
+        """Fill the Earley chart; return (items of each chart position, ends)"""
+        grammar = self.grammar
+        n = len(input_string)
+        # chart[i] holds items (lhs, production index, dot, origin); waiting[i]
+        # indexes the items of chart[i] by the non-terminal after their dot
+        chart = [[] for _ in range(n + 1)]
+        seen = [set() for _ in range(n + 1)]
+        waiting = [{} for _ in range(n + 1)]
+        
+        def add(position, item):
+            if item not in seen[position]:
+                seen[position].add(item)
+                chart[position].append(item)
+        
+        for index in range(len(grammar[self.start_symbol])):
+            add(0, (self.start_symbol, index, 0, 0))
+        
+        for i in range(n + 1):
+            items = chart[i]
+            k = 0
+            while k < len(items):
+                lhs, index, dot, origin = item = items[k]
+                k += 1
+                production = grammar[lhs][index]
+                
+                if dot == len(production):
+                    # Completer: advance every item that was waiting on lhs
+                    for parent_lhs, parent_index, parent_dot, parent_origin in waiting[origin].get(lhs, ()):
+                        add(i, (parent_lhs, parent_index, parent_dot + 1, parent_origin))
+                    continue
+                
+                symbol = production[dot]
+                if symbol in grammar:
+                    # Predictor (nullable symbols are stepped over directly)
+                    waiting[i].setdefault(symbol, []).append(item)
+                    for child_index in range(len(grammar[symbol])):
+                        add(i, (symbol, child_index, 0, i))
+                    if symbol in self.nullable:
+                        add(i, (lhs, index, dot + 1, origin))
+                elif input_string.startswith(symbol, i):
+                    # Scanner
+                    add(i + len(symbol), (lhs, index, dot + 1, origin))
+        
+        # ends[(A, i)] lists every j such that A derives input_string[i:j]
+        ends = {}
+        for j in range(n + 1):
+            for lhs, index, dot, origin in chart[j]:
+                if dot == len(grammar[lhs][index]):
+                    spans = ends.setdefault((lhs, origin), [])
+                    if j not in spans:
+                        spans.append(j)
+        return seen, ends
+    
+    def derivation_steps(self, tree, order='leftmost'):
+        """Lazily yield the DerivationStep records that build tree in the given order"""
+        if order not in ('leftmost', 'rightmost'):
+            raise ValueError("order must be 'leftmost' or 'rightmost'")
+        rightmost = order == 'rightmost'
+        kinds = self.symbol_kinds
+        # Every symbol on the expanding side of the chosen non-terminal is a
+        # terminal, so its position follows from a running count of the
+        # terminals already produced on that side; no form is ever built
+        finished = 0
+        length = 1
+        index = 0
+        stack = [tree]
+        while stack:
+            node = stack.pop()
+            if kinds[node.symbol] != NON_TERMINAL:
+                finished += 1
+                continue
+            production = tuple(child.symbol for child in node.children)
+            position = length - 1 - finished if rightmost else finished
+            yield DerivationStep(index, position, node.symbol, production)
+            index += 1
+            length += len(production) - 1
+            if rightmost:
+                stack.extend(node.children)
+            else:
+                stack.extend(reversed(node.children))
+    
+    def derive(self, input_string):
+        """Parse once and read both derivations off the parse tree"""
+        if self.cache is not None:
+            result = self.cache.get(input_string)
+            if result is None:
+                # Trees are frozen and forms are tuples, so results can be
+                # handed to every caller
+                result = self._derive(input_string)
+                self.cache.put(input_string, result)
+            return result
+        return self._derive(input_string)
+    
+    def _derive(self, input_string):
+        # The DFA rejects invalid input cheaply. Without one, a successful
+        # prediction or the one Earley chart both answers and gives the tree
+        if self.transitions is not None and not self.validate_input(input_string):
+            return Derivation(False)
+        with self.stats.timer('parse'):
+            choices = self.predict(input_string) if self.predictive else None
+            if choices is None:
+                seen, ends = self._earley(input_string)
+                if len(input_string) not in ends.get((self.start_symbol, 0), ()):
+                    return Derivation(False)
+        with self.stats.timer('tree'):
+            if choices is not None:
+                tree = self._tree_from_choices(choices)
+            else:
+                tree = self.trees.share(ParseForest(self, input_string, seen, ends).first_tree())
+        return Derivation(True, tree, self)
+    
+    def predict(self, input_string):
+        """Leftmost derivation of input_string driven by the LL(1) table
+        
+        Returns the (non-terminal ID, production index) pairs in the order
+        the derivation applies them, or None when the input is invalid, the
+        grammar is left-recursive or the search gives up. Each step looks
+        up one table cell; only conflict cells leave a choice point to
+        come back to, and the number of steps is bounded so that a grammar
+        full of conflicts cannot take exponential time.
+        """
+        if not self.predictive:
+            return None
+        kinds = self.symbol_kinds
+        table = self._ll1
+        pushed = self._pushed
+        single_char = self._single_char
+        n = len(input_string)
+        budget = 32 * (n + 1) * sum(map(len, pushed.values()))
+        stack = [self.start_id]  # symbols still to match, next one on top
+        position = 0
+        choices = []
+        # (stack, position, len(choices), non-terminal, cell, next alternative)
+        retry = []
+        while budget:
+            budget -= 1
+            if stack:
+                symbol = stack.pop()
+                if kinds[symbol] == NON_TERMINAL:
+                    row = table[symbol]
+                    if position == n:
+                        cell = row.get(END)
+                    elif single_char:
+                        cell = row.get(input_string[position])
+                    else:
+                        cell = self._lookahead_cell(row, input_string, position)
+                    if cell:
+                        if len(cell) > 1:
+                            retry.append((stack[:], position, len(choices), symbol, cell, 1))
+                        choices.append((symbol, cell[0]))
+                        stack.extend(pushed[symbol][cell[0]])
+                        continue
+                else:
+                    terminal = labels[symbol]
+                    if input_string.startswith(terminal, position):
+                        position += len(terminal)
+                        continue
+            elif position == n:
+                return choices
+            
+            # Dead end: resume the most recent conflict with its next alternative
+            if not retry:
+                return None
+            saved, position, count, symbol, cell, k = retry.pop()
+            if k + 1 < len(cell):
+                retry.append((saved, position, count, symbol, cell, k + 1))
+            stack = saved[:]
+            del choices[count:]
+            choices.append((symbol, cell[k]))
+            stack.extend(pushed[symbol][cell[k]])
+        return None
+    
+    def _lookahead_cell(self, row, input_string, position):
+        # Multi-character terminals: every terminal that matches here is a
+        # possible lookahead (a longer one may still fail later on)
+        cells = [row[terminal] for terminal in self._terminals_by_char.get(input_string[position], ())
+                 if terminal in row and input_string.startswith(terminal, position)]
+        if len(cells) <= 1:
+            return cells[0] if cells else None
+        return tuple(sorted(set().union(*cells)))
+    
+    def _tree_from_choices(self, choices):
+        """Build the shared, frozen parse tree from the productions of a leftmost derivation"""
+        rules = self.rules
+        kinds = self.symbol_kinds
+        leaf = Node.leaf
+        node = self.trees.node
+        # Walking the preorder productions backwards finishes every subtree
+        # before its parent, and leaves a node's leftmost child subtree on
+        # top of the stack
+        built = []
+        for symbol, index in reversed(choices):
+            built.append(node(symbol, tuple(built.pop() if kinds[part] == NON_TERMINAL else leaf(part)
+                                            for part in rules[symbol][index])))
+        return built[0]
+    
+    def cache_stats(self):
+        """Hit/miss/eviction counters of the derivation cache (None when disabled)"""
+        return self.cache.stats() if self.cache is not None else None
+    
+    @property
+    def language_tables(self):
+        if self._language is None:
+            self._language = Language(self)
+        return self._language
+    
+    def count(self, symbol=None, length=None):
+        """Number of distinct strings of `length` characters derivable from symbol (the start symbol by default)
+
+        With length None every length is summed, which raises ValueError when
+        the language is infinite. Counts come from the DFA or, for an LL(1)
+        grammar, from a dynamic program over the productions memoized per
+        symbol and length; only an ambiguous grammar without a DFA has to
+        enumerate the strings to tell equal ones apart.
+        """
+        return self.language_tables.count(symbol, length)
+    
+    def language(self, symbol=None, max_length=None):
+        """Lazily yield every string the grammar accepts, shortest first"""
+        return self.language_tables.strings(symbol, max_length)
+    
+    def sample(self, length=None, rng=None):
+        """One accepted string drawn uniformly at random, in O(length)
+
+        rng is a random.Random (the module's shared generator by default).
+        """
+        return self.language_tables.sample(length, rng=rng)
+    
+    def sample_many(self, count, length=None, seed=None, as_bytes=False):
+        """`count` uniform samples generated with numpy, as a list or as newline-terminated bytes"""
+        return self.language_tables.sample_many(count, length, seed, as_bytes)
     
     def leftmost_derivation(self, input_string):
-        if not self.validate_input(input_string):
+        result = self.derive(input_string)
+        if not result.valid:
             return "Invalid input", None
-        
-        # Create the root node and start with S
-        root = Node("S")
-        steps = ["S"]
-        current = "S"
-        
-        # Extract parts of the date string
-        parts = re.split(r'[-/.]', input_string)
-        month, day, year = parts
-        
-        # Determine the separator
-        separator = '/'
-        if '-' in input_string:
-            separator = '-'
-        elif '.' in input_string:
-            separator = '.'
-        
-        # Step 1: S -> M/D/Y or M-D-Y or M.D.Y based on the separator
-        if separator == '/':
-            replacement = "M/D/Y"
-        elif separator == '-':
-            replacement = "M-D-Y"
-        else:  # separator == '.'
-            replacement = "M.D.Y"
-        
-        current = replacement
-        steps.append(current)
-        
-        # Add children to root node based on the production used
-        m_node = Node("M")
-        sep1_node = Node(separator)
-        d_node = Node("D")
-        sep2_node = Node(separator)
-        y_node = Node("Y")
-        
-        root.add_child(m_node)
-        root.add_child(sep1_node)
-        root.add_child(d_node)
-        root.add_child(sep2_node)
-        root.add_child(y_node)
-        
-        # Step 2: Replace leftmost non-terminal M
-        if month[0] == '0':
-            m_replacement = "0X"
-            m_node.add_child(Node("0"))
-            m_node.add_child(Node("X"))
-        else:  # month[0] == '1'
-            m_replacement = "1V"
-            m_node.add_child(Node("1"))
-            m_node.add_child(Node("V"))
-        
-        current = current.replace("M", m_replacement, 1)
-        steps.append(current)
-        
-        # Step 3: Replace leftmost non-terminal (X or V)
-        if month[0] == '0':
-            x_replacement = month[1]
-            m_node.children[1].add_child(Node(month[1]))  # X -> digit
-            current = current.replace("X", x_replacement, 1)
-        else:  # month[0] == '1'
-            v_replacement = month[1]
-            m_node.children[1].add_child(Node(month[1]))  # V -> digit
-            current = current.replace("V", v_replacement, 1)
-        
-        steps.append(current)
-        
-        # Step 4: Replace leftmost non-terminal D
-        if day[0] == '0':
-            d_replacement = "0X"
-            d_node.add_child(Node("0"))
-            d_node.add_child(Node("X"))
-        elif day[0] in '12':
-            d_replacement = day[0] + "N"
-            d_node.add_child(Node(day[0]))
-            d_node.add_child(Node("N"))
-        else:  # day[0] == '3'
-            d_replacement = "3Z"
-            d_node.add_child(Node("3"))
-            d_node.add_child(Node("Z"))
-        
-        current = current.replace("D", d_replacement, 1)
-        steps.append(current)
-        
-        # Step 5: Replace leftmost non-terminal (X, N, or Z)
-        if day[0] == '0':
-            replacement = day[1]
-            d_node.children[1].add_child(Node(day[1]))  # X -> digit
-            current = current.replace("X", replacement, 1)
-        elif day[0] in '12':
-            replacement = day[1]
-            d_node.children[1].add_child(Node(day[1]))  # N -> digit
-            current = current.replace("N", replacement, 1)
-        else:  # day[0] == '3'
-            replacement = day[1]
-            d_node.children[1].add_child(Node(day[1]))  # Z -> digit
-            current = current.replace("Z", replacement, 1)
-        
-        steps.append(current)
-        
-        # Step 6: Replace Y -> NNNN
-        replacement = "NNNN"
-        for i in range(4):
-            y_node.add_child(Node("N"))
-        
-        current = current.replace("Y", replacement, 1)
-        steps.append(current)
-        
-        # Steps 7-10: Replace each N with a digit from year
-        for i in range(4):
-            digit = year[i]
-            y_node.children[i].add_child(Node(digit))
-            current = current.replace("N", digit, 1)
-            steps.append(current)
-        
-        return steps, root
+        return list(result.leftmost), result.tree
     
     def rightmost_derivation(self, input_string):
-        if not self.validate_input(input_string):
+        result = self.derive(input_string)
+        if not result.valid:
             return "Invalid input", None
-        
-        # Create the root node and start with S
-        root = Node("S")
-        steps = ["S"]
-        current = "S"
-        
-        # Extract parts of the date string
-        parts = re.split(r'[-/.]', input_string)
-        month, day, year = parts
-        
-        # Determine the separator
-        separator = '/'
-        if '-' in input_string:
-            separator = '-'
-        elif '.' in input_string:
-            separator = '.'
-        
-        # Add children to root node
-        m_node = Node("M")
-        sep1_node = Node(separator)
-        d_node = Node("D")
-        sep2_node = Node(separator)
-        y_node = Node("Y")
-        
-        root.add_child(m_node)
-        root.add_child(sep1_node)
-        root.add_child(d_node)
-        root.add_child(sep2_node)
-        root.add_child(y_node)
-        
-        # Step 1: S -> M/D/Y or M-D-Y or M.D.Y based on the separator
-        if separator == '/':
-            replacement = "M/D/Y"
-        elif separator == '-':
-            replacement = "M-D-Y"
-        else:  # separator == '.'
-            replacement = "M.D.Y"
-        
-        current = replacement
-        steps.append(current)
-        
-        # In rightmost derivation, we start with the rightmost non-terminal Y
-        # Step 2: Expand Y -> NNNN
-        current_y_index = current.rfind("Y")
-        if current_y_index != -1:
-            for i in range(4):
-                y_node.add_child(Node("N"))
-            current = current[:current_y_index] + "NNNN" + current[current_y_index+1:]
-            steps.append(current)
-            
-            # Step 3-6: Expand each N in NNNN from right to left
-            for i in range(3, -1, -1):  # Process 3, 2, 1, 0
-                n_index = current.rfind("N")
-                if n_index != -1:
-                    digit = year[i]
-                    y_node.children[i].add_child(Node(digit))
-                    current = current[:n_index] + digit + current[n_index+1:]
-                    steps.append(current)
-        
-        # Step 7: Expand D
-        d_index = current.rfind("D")
-        if d_index != -1:
-            if day[0] == '0':
-                d_replacement = "0X"
-                d_node.add_child(Node("0"))
-                d_node.add_child(Node("X"))
-            elif day[0] in '12':
-                d_replacement = day[0] + "N"
-                d_node.add_child(Node(day[0]))
-                d_node.add_child(Node("N"))
-            else:  # day[0] == '3'
-                d_replacement = "3Z"
-                d_node.add_child(Node("3"))
-                d_node.add_child(Node("Z"))
-            
-            current = current[:d_index] + d_replacement + current[d_index+1:]
-            steps.append(current)
-            
-            # Step 8: Expand X, N, or Z in D
-            if day[0] == '0':
-                x_index = current.rfind("X")
-                if x_index != -1:
-                    d_node.children[1].add_child(Node(day[1]))
-                    current = current[:x_index] + day[1] + current[x_index+1:]
-                    steps.append(current)
-            elif day[0] in '12':
-                n_index = current.rfind("N")
-                if n_index != -1:
-                    d_node.children[1].add_child(Node(day[1]))
-                    current = current[:n_index] + day[1] + current[n_index+1:]
-                    steps.append(current)
-            else:  # day[0] == '3'
-                z_index = current.rfind("Z")
-                if z_index != -1:
-                    d_node.children[1].add_child(Node(day[1]))
-                    current = current[:z_index] + day[1] + current[z_index+1:]
-                    steps.append(current)
-        
-        # Step 9: Expand M
-        m_index = current.rfind("M")
-        if m_index != -1:
-            if month[0] == '0':
-                m_replacement = "0X"
-                m_node.add_child(Node("0"))
-                m_node.add_child(Node("X"))
-            else:  # month[0] == '1'
-                m_replacement = "1V"
-                m_node.add_child(Node("1"))
-                m_node.add_child(Node("V"))
-            
-            current = current[:m_index] + m_replacement + current[m_index+1:]
-            steps.append(current)
-            
-            # Step 10: Expand X or V in M
-            if month[0] == '0':
-                x_index = current.rfind("X")
-                if x_index != -1:
-                    m_node.children[1].add_child(Node(month[1]))
-                    current = current[:x_index] + month[1] + current[x_index+1:]
-                    steps.append(current)
-            else:  # month[0] == '1'
-                v_index = current.rfind("V")
-                if v_index != -1:
-                    m_node.children[1].add_child(Node(month[1]))
-                    current = current[:v_index] + month[1] + current[v_index+1:]
-                    steps.append(current)
-        
-        return steps, root
+        return list(result.rightmost), result.tree
     
     # def build_tree_from_derivation(self, steps):
     #     # A simplified tree builder for demonstration purposes
@@ -0,0 +1,209 @@
+"""Headless entry point: validate (and optionally derive) inputs line by line.
+
+This module must never import tkinter or customtkinter so that it starts
+quickly and runs on machines without a display.
+
+    python cli.py dates.txt
+    cat dates.txt | python cli.py --leftmost --rightmost
+    python cli.py --scan server.log
+    python cli.py --jobs 8 --summary big.txt
+    python cli.py --export results.cfgd dates.txt
+    python cli.py --analysis --grammar grammars/date.bnf
+"""
+import argparse
+import sys
+from itertools import islice
+from cfg_parser import END, CFGParser
+from grammar import EPSILON
+
+
+def iter_inputs(paths):
+    """Yield stripped, non-empty input lines from the given files ('-' is stdin)"""
+    for path in paths:
+        if path == '-':
+            stream = sys.stdin
+        else:
+            stream = open(path, encoding='utf-8')
+        try:
+            # File iteration is buffered, so memory stays bounded by the
+            # longest line no matter how large the input is
+            for line in stream:
+                line = line.strip()
+                if line:
+                    yield line
+        finally:
+            if stream is not sys.stdin:
+                stream.close()
+
+
+def write_forms(out, prefix, forms, max_steps=None):
+    """Write sentential forms on one line, stopping after max_steps of them"""
+    out.write(prefix)
+    for i, form in enumerate(islice(forms, max_steps)):
+        if i:
+            out.write(" => ")
+        out.write(form)
+    out.write("\n")
+
+
+def process(parser, inputs, out, leftmost=False, rightmost=False, max_steps=None, exporter=None):
+    """Write one result line per input, return (valid, invalid) counts
+
+    exporter is an optional export.DerivationWriter that every result is
+    also streamed to.
+    """
+    valid_count = 0
+    invalid_count = 0
+    derive = leftmost or rightmost or exporter is not None
+    for input_string in inputs:
+        if derive:
+            result = parser.derive(input_string)
+            is_valid = result.valid
+            if exporter is not None:
+                exporter.write(input_string, result)
+        else:
+            is_valid = parser.validate_input(input_string)
+
+        if not is_valid:
+            invalid_count += 1
+            out.write(f"INVALID\t{input_string}\n")
+            continue
+
+        valid_count += 1
+        out.write(f"VALID\t{input_string}\n")
+        if leftmost:
+            write_forms(out, "  leftmost:  ", result.forms('leftmost'), max_steps)
+        if rightmost:
+            write_forms(out, "  rightmost: ", result.forms('rightmost'), max_steps)
+    return valid_count, invalid_count
+
+
+def process_parallel(paths, jobs, out, summary=False, grammar=None):
+    """Validate whole files with a process pool, writing results in input order"""
+    import os
+    import time
+    import parallel
+
+    # Only counts are kept, so memory does not grow with the number of lines
+    valid_count = invalid_count = 0
+    byte_count = 0
+    started = time.perf_counter()
+    for path in paths:
+        if path == '-':
+            raise SystemExit("--jobs needs file arguments, not stdin")
+        with open(path, 'rb') as file:
+            for start, end, flags in parallel.iter_chunk_results(path, jobs, grammar=grammar):
+                # Results come back as one flag per line; the text is re-read
+                # here sequentially instead of being shipped from the workers
+                file.seek(start)
+                lines = parallel.split_lines(file.read(end - start))
+                for line, flag in zip(lines, flags):
+                    if flag != parallel.BLANK:
+                        status = "VALID" if flag == parallel.VALID else "INVALID"
+                        out.write(f"{status}\t{line.strip()}\n")
+                valid_count += flags.count(parallel.VALID)
+                invalid_count += flags.count(parallel.INVALID)
+        byte_count += os.path.getsize(path)
+
+    stats = parallel.summarize(valid_count, invalid_count, byte_count, time.perf_counter() - started)
+    if summary:
+        sys.stderr.write(f"{stats.valid} valid, {stats.invalid} invalid, "
+                         f"{stats.lines_per_second:,.0f} lines/s "
+                         f"({stats.bytes / max(stats.seconds, 1e-9) / 1e6:.1f} MB/s)\n")
+    return 0 if stats.invalid == 0 else 1
+
+
+def write_analysis(parser, out):
+    """Print the nullable, FIRST and FOLLOW sets and the LL(1) table with its conflicts"""
+    def names(symbols):
+        return ' '.join(sorted('$' if symbol == END else symbol for symbol in symbols))
+
+    out.write(f"nullable: {names(parser.nullable) or '-'}\n")
+    for symbol in parser.grammar:
+        out.write(f"{symbol}: FIRST {{{names(parser.first[symbol])}}} FOLLOW {{{names(parser.follow[symbol])}}}\n")
+    out.write("LL(1) table:\n")
+    for symbol, row in parser.ll1_table.items():
+        productions = parser.grammar[symbol]
+        for lookahead, indices in sorted(row.items()):
+            rules = ' | '.join(' '.join(productions[index]) or EPSILON for index in indices)
+            out.write(f"  {symbol}, {'$' if lookahead == END else lookahead}: {symbol} -> {rules}\n")
+    for symbol, lookahead, indices in parser.ll1_conflicts:
+        out.write(f"conflict: {symbol} on {'$' if lookahead == END else lookahead!r} "
+                  f"({len(indices)} productions)\n")
+    if parser.left_recursive:
+        out.write(f"left-recursive: {names(parser.left_recursive)}\n")
+    mode = 'predictive' if parser.predictive else 'chart parser (the grammar is left-recursive or cyclic)'
+    out.write(f"derivations: {mode}\n")
+
+
+def main(argv=None):
+    arg_parser = argparse.ArgumentParser(description="Validate date strings against the CFG without the GUI.")
+    arg_parser.add_argument('files', nargs='*', default=['-'],
+                            help="input files with one string per line (default: stdin)")
+    arg_parser.add_argument('--grammar', default=None, metavar='FILE',
+                            help="grammar to validate against, .bnf or .json (default: the bundled date grammar)")
+    arg_parser.add_argument('--leftmost', action='store_true', help="also print the leftmost derivation")
+    arg_parser.add_argument('--rightmost', action='store_true', help="also print the rightmost derivation")
+    arg_parser.add_argument('--max-steps', type=int, default=None, metavar='N',
+                            help="print at most N sentential forms per derivation")
+    arg_parser.add_argument('--scan', action='store_true',
+                            help="report every accepted substring of the files with its byte offset")
+    arg_parser.add_argument('--jobs', type=int, default=0,
+                            help="validate files with this many worker processes (no derivations)")
+    arg_parser.add_argument('--cache', type=int, default=0, metavar='N',
+                            help="keep the derivations of the N most recent distinct inputs")
+    arg_parser.add_argument('--summary', action='store_true', help="print valid/invalid counts to stderr")
+    arg_parser.add_argument('--export', default=None, metavar='FILE',
+                            help="also stream every derivation to FILE (JSON Lines if it ends in .jsonl, "
+                                 "compact binary otherwise)")
+    arg_parser.add_argument('--analysis', action='store_true',
+                            help="print the grammar's FIRST/FOLLOW sets and LL(1) table, then exit")
+    args = arg_parser.parse_args(argv)
+
+    # One parser (and one compiled grammar) for the whole run
+    parser = CFGParser(cache_size=args.cache, grammar=args.grammar)
+
+    if args.analysis:
+        write_analysis(parser, sys.stdout)
+        return 0
+
+    if args.scan:
+        from scanner import Scanner
+        scanner = Scanner(parser)
+        match_count = 0
+        for path in args.files:
+            for offset, text, separator in scanner.scan_file(path):
+                match_count += 1
+                sys.stdout.write(f"{path}:{offset}\t{text}\t{separator}\n")
+        if args.summary:
+            sys.stderr.write(f"{match_count} matches\n")
+        return 0
+
+    if args.jobs:
+        if args.export:
+            raise SystemExit("--export needs derivations, which --jobs does not produce")
+        return process_parallel(args.files, args.jobs, sys.stdout, args.summary, parser.definition)
+
+    exporter = None
+    if args.export:
+        from export import DerivationWriter
+        exporter = DerivationWriter(args.export, parser, 'jsonl' if args.export.endswith('.jsonl') else 'binary')
+    try:
+        valid_count, invalid_count = process(parser, iter_inputs(args.files), sys.stdout,
+                                             leftmost=args.leftmost, rightmost=args.rightmost,
+                                             max_steps=args.max_steps, exporter=exporter)
+    finally:
+        if exporter is not None:
+            exporter.close()
+
+    if args.summary:
+        sys.stderr.write(f"{valid_count} valid, {invalid_count} invalid\n")
+        if parser.cache is not None:
+            stats = parser.cache_stats()
+            sys.stderr.write(f"cache: {stats['hits']} hits, {stats['misses']} misses, "
+                             f"{stats['evictions']} evictions ({stats['hit_rate']:.1%} hit rate)\n")
+    return 0 if invalid_count == 0 else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
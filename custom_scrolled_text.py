@@ -3,7 +3,7 @@ from tkinter import scrolledtext
 import customtkinter as ctk
 
 class CustomScrolledText(tk.Frame):
-    def __init__(self, master=None, **kwargs):
+    def __init__(self, master=None, max_lines=None, **kwargs):
         # Get the current appearance mode index (0 for Light, 1 for Dark)
         mode_index = 1 if ctk.get_appearance_mode() == "Dark" else 0
         
@@ -13,6 +13,8 @@ class CustomScrolledText(tk.Frame):
         select_color = ctk.ThemeManager.theme["CTkButton"]["fg_color"][mode_index]
         
         super().__init__(master, bg=bg_color)
+        # Oldest lines are dropped once the text grows past max_lines
+        self.max_lines = max_lines
         self.grid_rowconfigure(0, weight=1)
         self.grid_columnconfigure(0, weight=1)
         
@@ -32,6 +34,25 @@ class CustomScrolledText(tk.Frame):
     
     def insert(self, index, text):
         self.text.insert(index, text)
+        self._trim()
+    
+    def append_lines(self, lines):
+        """Append a block of lines at the end with a single Tk insert"""
+        block = "\n".join(lines)
+        if block:
+            self.text.insert(tk.END, block + "\n")
+            self._trim()
+    
+    def _trim(self):
+        if self.max_lines is None:
+            return
+        # 'end-1c' is the last character; after a trailing newline it sits at
+        # column 0 of an empty line that does not count
+        line, column = self.text.index('end-1c').split('.')
+        line_count = int(line) - 1 if column == '0' else int(line)
+        excess = line_count - self.max_lines
+        if excess > 0:
+            self.text.delete("1.0", f"{excess + 1}.0")
     
     def delete(self, start, end):
         self.text.delete(start, end)
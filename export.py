@@ -0,0 +1,284 @@
+"""Streaming export of derivation results as JSON Lines or a compact binary format.
+
+Both formats store a derivation as its input plus the production IDs of the
+parse tree in preorder, which is exactly the sequence of productions used
+by the leftmost derivation. Steps, sentential forms (in either order) and
+the Node tree are rebuilt from those IDs only when a reader asks for them.
+
+Production IDs number the grammar's productions in file order. Each file
+starts with a header that lists them, so a file can only be read back
+against the grammar it was written with.
+
+Binary layout, after the 4-byte magic and a varint-length JSON header:
+
+    varint input length, UTF-8 input,
+    then 0x00 (invalid) or 0x01 followed by varint (id + 1)... and 0x00
+"""
+import json
+from cfg_parser import sentential_forms
+from node import Node
+from symbols import NON_TERMINAL, intern
+
+MAGIC = b'CFGD'
+FORMAT_VERSION = 1
+
+
+def production_table(parser):
+    """[(lhs, production)] in ID order"""
+    return [(lhs, tuple(production)) for lhs, productions in parser.grammar.items()
+            for production in productions]
+
+
+def _header(parser):
+    return {
+        'format': 'cfg-derivations',
+        'version': FORMAT_VERSION,
+        'grammar': parser.definition.key,
+        'start': parser.start_symbol,
+        'productions': [[lhs, list(production)] for lhs, production in production_table(parser)],
+    }
+
+
+def _write_varint(buffer, value):
+    while value >= 0x80:
+        buffer.append((value & 0x7F) | 0x80)
+        value >>= 7
+    buffer.append(value)
+
+
+def _read_varint(data, position):
+    value = 0
+    shift = 0
+    while True:
+        byte = data[position]
+        position += 1
+        value |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return value, position
+        shift += 7
+
+
+class DerivationWriter:
+    """Append derivation results to a file as they are produced
+
+    Records are encoded straight into one reusable bytearray, which is
+    written out whenever it grows past buffer_size bytes.
+    """
+
+    def __init__(self, path, parser, format='binary', buffer_size=1 << 16):
+        if format not in ('binary', 'jsonl'):
+            raise ValueError("format must be 'binary' or 'jsonl'")
+        self.parser = parser
+        self.format = format
+        self.buffer_size = buffer_size
+        self.count = 0
+        # Production ID by (lhs, production) in interned symbol IDs
+        self._ids = {(intern(lhs), tuple(map(intern, production))): index
+                     for index, (lhs, production) in enumerate(production_table(parser))}
+        self._buffer = bytearray()
+        self._file = open(path, 'wb')
+
+        header = json.dumps(_header(parser), ensure_ascii=False).encode('utf-8')
+        if format == 'binary':
+            self._buffer += MAGIC
+            _write_varint(self._buffer, len(header))
+            self._buffer += header
+        else:
+            self._buffer += header + b'\n'
+
+    def write(self, input_string, derivation=None):
+        """Record one input; it is derived here unless its Derivation is given"""
+        if derivation is None:
+            derivation = self.parser.derive(input_string)
+        buffer = self._buffer
+        text = input_string.encode('utf-8')
+        if self.format == 'binary':
+            _write_varint(buffer, len(text))
+            buffer += text
+            if derivation.valid:
+                buffer.append(1)
+                for production_id in self._production_ids(derivation.tree):
+                    _write_varint(buffer, production_id + 1)
+            buffer.append(0)
+        else:
+            buffer += b'{"input": '
+            buffer += json.dumps(input_string, ensure_ascii=False).encode('utf-8')
+            if derivation.valid:
+                buffer += b', "valid": true, "productions": ['
+                first = True
+                for production_id in self._production_ids(derivation.tree):
+                    if not first:
+                        buffer += b','
+                    buffer += b'%d' % production_id
+                    first = False
+                buffer += b']}\n'
+            else:
+                buffer += b', "valid": false}\n'
+        self.count += 1
+        if len(buffer) >= self.buffer_size:
+            self.flush()
+
+    def _production_ids(self, tree):
+        # Preorder over the non-terminal nodes, i.e. leftmost derivation order
+        ids = self._ids
+        kinds = self.parser.symbol_kinds
+        stack = [tree]
+        while stack:
+            node = stack.pop()
+            if kinds[node.symbol] == NON_TERMINAL:
+                yield ids[node.symbol, tuple(child.symbol for child in node.children)]
+                stack.extend(reversed(node.children))
+
+    def flush(self):
+        self._file.write(self._buffer)
+        self._buffer.clear()
+
+    def close(self):
+        if not self._file.closed:
+            self.flush()
+            self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+
+class StoredDerivation:
+    """One record read back from an export; tree and steps are rebuilt on demand"""
+    __slots__ = ('input', 'valid', 'productions', '_parser', '_table', '_tree')
+
+    def __init__(self, input_string, valid, productions, parser, table=None):
+        self.input = input_string
+        self.valid = valid
+        self.productions = productions  # production IDs in preorder
+        self._parser = parser
+        self._table = table
+        self._tree = None
+
+    @property
+    def tree(self):
+        if self.valid and self._tree is None:
+            self._tree = build_tree(self._parser, self.productions, self._table)
+        return self._tree
+
+    def steps(self, order='leftmost'):
+        """Yield the DerivationStep records of the given order"""
+        return self._parser.derivation_steps(self.tree, order)
+
+    def forms(self, order='leftmost'):
+        """Yield the sentential forms of the given order"""
+        return sentential_forms(self._parser.start_id, self.steps(order))
+
+
+def build_tree(parser, productions, table=None):
+    """Rebuild the Node tree from production IDs in preorder"""
+    table = table or production_table(parser)
+    grammar = parser.grammar
+    root = Node(parser.start_symbol)
+    stack = [root]  # non-terminal nodes still to expand, leftmost on top
+    for production_id in productions:
+        if not stack:
+            raise ValueError("more production IDs than the tree has non-terminals")
+        node = stack.pop()
+        lhs, production = table[production_id]
+        if lhs != node.value:
+            raise ValueError(f"production {production_id} expands {lhs}, not {node.value}")
+        for symbol in production:
+            node.add_child(Node(symbol) if symbol in grammar else Node.leaf(symbol))
+        stack.extend(child for child in reversed(node.children) if child.value in grammar)
+    if stack:
+        raise ValueError("too few production IDs to complete the tree")
+    return root
+
+
+class DerivationReader:
+    """Iterate over the StoredDerivation records of an export file (either format)"""
+
+    def __init__(self, path, parser, buffer_size=1 << 16):
+        self.parser = parser
+        self.buffer_size = buffer_size
+        self._file = open(path, 'rb')
+        self.binary = self._file.read(len(MAGIC)) == MAGIC
+        if not self.binary:
+            self._file.seek(0)
+        self._data = bytearray()
+        self._position = 0
+        self.header = self._read_header()
+        self.table = production_table(parser)
+        expected = [[lhs, list(production)] for lhs, production in self.table]
+        if self.header.get('format') != 'cfg-derivations' or self.header.get('version') != FORMAT_VERSION:
+            raise ValueError(f"{path} is not a version {FORMAT_VERSION} derivation export")
+        if self.header['productions'] != expected:
+            raise ValueError(f"{path} was written with a different grammar")
+
+    def _read_header(self):
+        if not self.binary:
+            return json.loads(self._file.readline())
+        length, _ = self._take(_read_varint)
+        header = self._take_bytes(length)
+        return json.loads(bytes(header))
+
+    def _fill(self):
+        # Drop what has been consumed and read the next chunk; False at EOF
+        chunk = self._file.read(self.buffer_size)
+        del self._data[:self._position]
+        self._position = 0
+        self._data += chunk
+        return bool(chunk)
+
+    def _take(self, decode):
+        while True:
+            try:
+                value, position = decode(self._data, self._position)
+            except IndexError:
+                if not self._fill():
+                    raise ValueError("export file is truncated")
+                continue
+            self._position = position
+            return value, position
+
+    def _take_bytes(self, length):
+        while len(self._data) - self._position < length:
+            if not self._fill():
+                raise ValueError("export file is truncated")
+        value = self._data[self._position:self._position + length]
+        self._position += length
+        return value
+
+    def __iter__(self):
+        parser = self.parser
+        if not self.binary:
+            for line in self._file:
+                if line.strip():
+                    record = json.loads(line)
+                    yield StoredDerivation(record['input'], record['valid'], record.get('productions', ()),
+                                           parser, self.table)
+            return
+
+        while True:
+            if self._position >= len(self._data) and not self._fill():
+                return
+            length, _ = self._take(_read_varint)
+            text = self._take_bytes(length).decode('utf-8')
+            valid = self._take_bytes(1)[0] == 1
+            productions = []
+            if valid:
+                while True:
+                    production_id, _ = self._take(_read_varint)
+                    if production_id == 0:
+                        break
+                    productions.append(production_id - 1)
+            yield StoredDerivation(text, valid, productions, parser, self.table)
+
+    def close(self):
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
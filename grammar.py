@@ -0,0 +1,147 @@
+import hashlib
+import json
+import os
+import re
+
+GRAMMAR_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'grammars')
+DEFAULT_GRAMMAR = os.path.join(GRAMMAR_DIR, 'date.bnf')
+
+# Compiled tables are stored here as <hash of the grammar text>.json
+CACHE_DIR = os.environ.get('CFG_PARSER_CACHE') or os.path.join(os.path.expanduser('~'), '.cache', 'cfg_parser')
+
+# Part of every cache key; bump it when the layout of the cached tables changes
+TABLES_VERSION = 3
+
+EPSILON = 'ε'
+
+_TOKEN = re.compile(r"'[^']*'|\"[^\"]*\"|\S+")
+
+
+class Grammar:
+    """A grammar definition: productions, start symbol and the text it was read from"""
+
+    def __init__(self, rules, start, text, kind='bnf', path=None):
+        self.rules = rules  # non-terminal -> list of productions (lists of symbols)
+        self.start = start
+        self.text = text
+        self.kind = kind
+        self.path = path
+
+    @property
+    def key(self):
+        """Hash of the grammar text that names its entry in the table cache"""
+        digest = hashlib.sha256(f"{TABLES_VERSION}:{self.kind}:".encode('utf-8'))
+        digest.update(self.text.encode('utf-8'))
+        return digest.hexdigest()
+
+    def format(self):
+        """The rules in compact notation (`S -> M/D/Y | ...`) for display"""
+        symbols = {symbol for productions in self.rules.values() for production in productions
+                   for symbol in production} | set(self.rules)
+        # Symbols are only run together when that cannot be misread
+        joiner = '' if all(len(symbol) == 1 for symbol in symbols) else ' '
+        return "\n".join(f"{lhs} -> " + " | ".join(joiner.join(production) or EPSILON
+                                                  for production in productions)
+                         for lhs, productions in self.rules.items())
+
+
+def parse_bnf(text, path=None):
+    """Read a grammar written as `A -> alternative | alternative` lines"""
+    where = path or '<grammar>'
+    rules = {}
+    quoted = set()
+    lhs = None
+    for number, line in enumerate(text.splitlines(), 1):
+        tokens = _TOKEN.findall(line)
+        if not tokens or tokens[0].startswith('#'):
+            continue
+        if len(tokens) >= 2 and tokens[1] in ('->', '::='):
+            lhs = tokens[0]
+            tokens = tokens[2:]
+            alternatives = rules.setdefault(lhs, [])
+            alternatives.append([])
+        elif tokens[0] == '|' and lhs is not None:
+            # Continuation of the rule above
+            tokens = tokens[1:]
+            alternatives.append([])
+        else:
+            raise ValueError(f"{where}:{number}: expected 'A -> ...' or a line starting with '|'")
+
+        for token in tokens:
+            if token.startswith('#'):
+                break
+            if token == '|':
+                alternatives.append([])
+            elif token == EPSILON:
+                continue
+            elif token[0] in '\'"' and len(token) > 1 and token[-1] == token[0]:
+                if len(token) == 2:
+                    raise ValueError(f"{where}:{number}: empty terminal {token}; use {EPSILON} instead")
+                quoted.add(token[1:-1])
+                alternatives[-1].append(token[1:-1])
+            else:
+                alternatives[-1].append(token)
+
+    if not rules:
+        raise ValueError(f"{where}: the grammar has no rules")
+    # A quoted terminal spelled like a non-terminal could not be told apart from it
+    clashes = sorted(quoted & set(rules))
+    if clashes:
+        raise ValueError(f"{where}: quoted terminals also used as non-terminals: {', '.join(clashes)}")
+    return rules, next(iter(rules))
+
+
+def parse_json(text, path=None):
+    """Read a grammar stored as {"start": "S", "rules": {"S": [["M", "/", ...], ...], ...}}"""
+    where = path or '<grammar>'
+    data = json.loads(text)
+    rules = data.get('rules') if isinstance(data, dict) else None
+    if not isinstance(rules, dict) or not rules:
+        raise ValueError(f"{where}: expected an object with a non-empty 'rules' mapping")
+    for lhs, productions in rules.items():
+        if not (isinstance(productions, list)
+                and all(isinstance(production, list) and all(isinstance(symbol, str) and symbol
+                                                             for symbol in production)
+                        for production in productions)):
+            raise ValueError(f"{where}: the rules of {lhs!r} must be lists of non-empty symbol strings")
+    start = data.get('start', next(iter(rules)))
+    if start not in rules:
+        raise ValueError(f"{where}: start symbol {start!r} has no rules")
+    return rules, start
+
+
+def load_grammar(path=None):
+    """Load a .bnf or .json grammar file (the bundled date grammar by default)"""
+    path = path or DEFAULT_GRAMMAR
+    with open(path, encoding='utf-8') as file:
+        text = file.read()
+    kind = 'json' if path.endswith('.json') else 'bnf'
+    rules, start = (parse_json if kind == 'json' else parse_bnf)(text, path)
+    return Grammar(rules, start, text, kind, path)
+
+
+def load_tables(grammar, cache_dir=CACHE_DIR):
+    """Compiled tables cached for this grammar text, or None"""
+    try:
+        with open(os.path.join(cache_dir, grammar.key + '.json'), encoding='utf-8') as file:
+            tables = json.load(file)
+    except (OSError, ValueError):
+        return None
+    return tables if tables.get('version') == TABLES_VERSION else None
+
+
+def store_tables(grammar, tables, cache_dir=CACHE_DIR):
+    """Write tables to the cache; an unwritable cache directory is not an error"""
+    path = os.path.join(cache_dir, grammar.key + '.json')
+    temporary = f"{path}.{os.getpid()}.tmp"
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        with open(temporary, 'w', encoding='utf-8') as file:
+            json.dump(dict(tables, version=TABLES_VERSION), file, ensure_ascii=False)
+        # Concurrent starts (e.g. pool workers) may race; the rename is atomic
+        os.replace(temporary, path)
+    except OSError:
+        try:
+            os.remove(temporary)
+        except OSError:
+            pass
@@ -0,0 +1,103 @@
+import json
+import threading
+import time
+from collections import deque
+
+
+class _NullTimer:
+    """Context manager that does nothing; returned while stats are disabled"""
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_TIMER = _NullTimer()
+
+
+class _Timer:
+    __slots__ = ('stats', 'phase', 'start')
+
+    def __init__(self, stats, phase):
+        self.stats = stats
+        self.phase = phase
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.stats.record(self.phase, time.perf_counter() - self.start)
+        return False
+
+
+class PhaseStats:
+    """Toggleable per-phase call counts and timings
+
+    Counts and totals cover every recorded call; percentiles are computed over
+    the most recent `sample_size` timings of each phase. While disabled,
+    timer() hands back a shared no-op context manager and nothing is recorded.
+    """
+
+    def __init__(self, enabled=False, sample_size=1024):
+        self.enabled = enabled
+        self.sample_size = sample_size
+        self._phases = {}  # phase -> [count, total seconds, max seconds, recent samples]
+        self._lock = threading.Lock()
+
+    def timer(self, phase):
+        """Context manager that times its block under the given phase"""
+        if not self.enabled:
+            return _NULL_TIMER
+        return _Timer(self, phase)
+
+    def record(self, phase, seconds):
+        # Phases are recorded from both the parse worker and the Tk thread
+        with self._lock:
+            entry = self._phases.get(phase)
+            if entry is None:
+                entry = self._phases[phase] = [0, 0.0, 0.0, deque(maxlen=self.sample_size)]
+            entry[0] += 1
+            entry[1] += seconds
+            entry[2] = max(entry[2], seconds)
+            entry[3].append(seconds)
+
+    def reset(self):
+        with self._lock:
+            self._phases.clear()
+
+    def snapshot(self):
+        """Per-phase summary: count, total/mean/max and p50/p90/p99 in milliseconds"""
+        with self._lock:
+            entries = {phase: (entry[0], entry[1], entry[2], sorted(entry[3]))
+                       for phase, entry in self._phases.items()}
+        summary = {}
+        for phase, (count, total, longest, samples) in entries.items():
+            summary[phase] = {
+                'count': count,
+                'total_ms': total * 1e3,
+                'mean_ms': total / count * 1e3,
+                'max_ms': longest * 1e3,
+                'p50_ms': _percentile(samples, 0.50) * 1e3,
+                'p90_ms': _percentile(samples, 0.90) * 1e3,
+                'p99_ms': _percentile(samples, 0.99) * 1e3,
+            }
+        return summary
+
+    def to_json(self, indent=2):
+        return json.dumps(self.snapshot(), indent=indent, sort_keys=True)
+
+    def dump(self, path):
+        with open(path, 'w') as file:
+            file.write(self.to_json())
+
+
+def _percentile(sorted_samples, fraction):
+    # Nearest-rank percentile of an already sorted list
+    if not sorted_samples:
+        return 0.0
+    rank = min(len(sorted_samples) - 1, max(0, int(round(fraction * len(sorted_samples))) - 1))
+    return sorted_samples[rank]
@@ -0,0 +1,432 @@
+import random
+from bisect import bisect_right
+
+
+class Language:
+    """Counting, enumeration and uniform sampling over the strings of a parser's grammar
+
+    Derivations are counted per (symbol, length) by memoized dynamic
+    programming over the productions, so no string is ever built to count
+    it. count() and strings() are about distinct strings. When the grammar
+    compiled into a DFA, the start symbol's strings are counted, enumerated
+    and sampled on the DFA, using the number of accepted completions of every
+    state, which makes the samples exactly uniform over distinct strings and
+    O(length) each. An LL(1) grammar is unambiguous, so its derivation counts
+    are string counts. Any other grammar has its strings deduplicated one
+    length at a time, and its samples are uniform over derivations.
+    """
+
+    def __init__(self, parser):
+        self.parser = parser
+        self.grammar = parser.grammar
+        self._counts = {}      # (symbol, length) -> number of derivations
+        self._ways = {}        # (lhs, production index, position, length) -> ways to derive the rest
+        self._warm = 0         # every symbol is counted for all lengths below this
+        self._active = set()   # (symbol, length) pairs being counted, to catch cycles
+        self._completions = []  # _completions[n][state]: accepted strings of length n from state
+        self._choices = {}     # (remaining, state) -> (characters, targets, cumulative weights)
+        self._length_weights = {}  # symbol -> count of every possible length
+
+    @property
+    def unambiguous(self):
+        """True when every string has exactly one derivation (the grammar is LL(1))"""
+        return not self.parser.ll1_conflicts
+
+    def count(self, symbol=None, length=None):
+        """Distinct strings of the given length derivable from symbol (all lengths when None)"""
+        symbol = symbol or self.parser.start_symbol
+        if length is None:
+            longest = self.max_length(symbol)
+            if longest is None:
+                raise ValueError(f"'{symbol}' derives infinitely many strings; pass a length")
+            return sum(self.count(symbol, n) for n in range(longest + 1))
+        if not self.derivations(symbol, length):
+            return 0
+        if self._uses_dfa(symbol):
+            return self._completions_for(length)[length][0]
+        if self.unambiguous:
+            return self.derivations(symbol, length)
+        # Ambiguous: only enumerating tells equal strings apart
+        return sum(1 for _ in self._distinct_strings(symbol, length))
+
+    def derivations(self, symbol=None, length=None):
+        """Derivations from symbol of strings of the given length (all lengths when None)
+
+        This equals count() for an unambiguous grammar, and is always
+        computed without building any string.
+        """
+        symbol = symbol or self.parser.start_symbol
+        if length is None:
+            longest = self.max_length(symbol)
+            if longest is None:
+                raise ValueError(f"'{symbol}' derives infinitely many strings; pass a length")
+            return sum(self.derivations(symbol, n) for n in range(longest + 1))
+        if symbol not in self.grammar:
+            return int(len(symbol) == length)
+        # Fill shorter lengths first so that the recursion below only ever
+        # descends through symbols of the same length (nullable chains)
+        for n in range(self._warm, length):
+            for lhs in self.grammar:
+                self._count(lhs, n)
+            self._warm = n + 1
+        return self._count(symbol, length)
+
+    def _count(self, symbol, length):
+        if symbol not in self.grammar:
+            return int(len(symbol) == length)
+        key = (symbol, length)
+        total = self._counts.get(key)
+        if total is not None:
+            return total
+        if key in self._active:
+            raise ValueError(f"Grammar is cyclic through '{symbol}'; it has infinitely many derivations")
+        self._active.add(key)
+        try:
+            total = sum(self._rest(symbol, index, 0, length) for index in range(len(self.grammar[symbol])))
+        finally:
+            self._active.discard(key)
+        self._counts[key] = total
+        return total
+
+    def _rest(self, lhs, index, position, length):
+        """Ways for symbols production[position:] of lhs to derive exactly `length` characters"""
+        production = self.grammar[lhs][index]
+        if position == len(production):
+            return int(length == 0)
+        key = (lhs, index, position, length)
+        ways = self._ways.get(key)
+        if ways is not None:
+            return ways
+        symbol = production[position]
+        ways = 0
+        if symbol not in self.grammar:
+            if len(symbol) <= length:
+                ways = self._rest(lhs, index, position + 1, length - len(symbol))
+        else:
+            for head in range(length + 1):
+                # The rest is counted first so that impossible splits never
+                # ask for the head symbol (which could falsely look cyclic)
+                tail = self._rest(lhs, index, position + 1, length - head)
+                if tail:
+                    ways += self._count(symbol, head) * tail
+        self._ways[key] = ways
+        return ways
+
+    def max_length(self, symbol=None):
+        """Length of the longest string symbol derives, or None when unbounded"""
+        symbol = symbol or self.parser.start_symbol
+        longest = {}
+        open_symbols = set()
+
+        def visit(current):
+            # A symbol met again while still open is recursive: no bound
+            if current not in self.grammar:
+                return len(current)
+            if current in longest:
+                return longest[current]
+            if current in open_symbols:
+                return None
+            open_symbols.add(current)
+            best = 0
+            for production in self.grammar[current]:
+                total = 0
+                for part in production:
+                    size = visit(part)
+                    if size is None:
+                        return None
+                    total += size
+                best = max(best, total)
+            open_symbols.discard(current)
+            longest[current] = best
+            return best
+
+        return visit(symbol)
+
+    def strings(self, symbol=None, max_length=None):
+        """Lazily yield the distinct strings of symbol, shortest first
+
+        Without max_length this runs until the language is exhausted, which
+        for a recursive grammar is never.
+        """
+        symbol = symbol or self.parser.start_symbol
+        longest = self.max_length(symbol)
+        if max_length is not None:
+            longest = max_length if longest is None else min(longest, max_length)
+        length = 0
+        while longest is None or length <= longest:
+            if self.derivations(symbol, length):
+                if self._uses_dfa(symbol):
+                    yield from self._dfa_strings(length)
+                elif self.unambiguous:
+                    yield from self._grammar_strings(symbol, length)
+                else:
+                    yield from self._distinct_strings(symbol, length)
+            length += 1
+
+    def _distinct_strings(self, symbol, length):
+        # Strings of one length are all held at once, never those of others
+        seen = set()
+        for text in self._grammar_strings(symbol, length):
+            if text not in seen:
+                seen.add(text)
+                yield text
+
+    def _grammar_strings(self, symbol, length):
+        # Every derivation of `length` characters, production by production
+        if symbol not in self.grammar:
+            yield symbol
+            return
+        for index in range(len(self.grammar[symbol])):
+            if self._rest(symbol, index, 0, length):
+                yield from self._production_strings(symbol, index, 0, length)
+
+    def _production_strings(self, lhs, index, position, length):
+        production = self.grammar[lhs][index]
+        if position == len(production):
+            yield ''
+            return
+        symbol = production[position]
+        heads = [len(symbol)] if symbol not in self.grammar else range(length + 1)
+        for head in heads:
+            if head <= length and self._rest(lhs, index, position + 1, length - head) \
+                    and self._count(symbol, head):
+                for prefix in self._grammar_strings(symbol, head):
+                    for suffix in self._production_strings(lhs, index, position + 1, length - head):
+                        yield prefix + suffix
+
+    def _dfa_strings(self, length):
+        # Distinct strings in code point order; branches that cannot reach an
+        # accepting state in exactly the remaining characters are never entered
+        completions = self._completions_for(length)
+        transitions = self.parser.transitions
+        stack = [('', 0)]
+        while stack:
+            prefix, state = stack.pop()
+            remaining = length - len(prefix)
+            if remaining == 0:
+                yield prefix
+                continue
+            for char, target in sorted(transitions[state].items(), reverse=True):
+                if completions[remaining - 1][target]:
+                    stack.append((prefix + char, target))
+
+    def sample(self, length=None, symbol=None, rng=None):
+        """One string drawn uniformly from those of the given length (any length when None)"""
+        symbol = symbol or self.parser.start_symbol
+        rng = rng or random
+        if length is None:
+            length = self._random_length(symbol, rng)
+        elif not self.derivations(symbol, length):
+            raise ValueError(f"'{symbol}' derives no string of length {length}")
+        if self._uses_dfa(symbol):
+            return self._dfa_sample(length, rng)
+        return self._grammar_sample(symbol, length, rng)
+
+    def _random_length(self, symbol, rng):
+        weights = self._length_weights.get(symbol)
+        if weights is None:
+            longest = self.max_length(symbol)
+            if longest is None:
+                raise ValueError(f"'{symbol}' derives infinitely many strings; pass a length")
+            # Lengths are weighted by what the sampler is uniform over:
+            # distinct strings on the DFA, derivations otherwise
+            weigh = self.count if self._uses_dfa(symbol) else self.derivations
+            weights = self._length_weights[symbol] = [weigh(symbol, n) for n in range(longest + 1)]
+        total = sum(weights)
+        if not total:
+            raise ValueError(f"'{symbol}' derives no strings")
+        pick = rng.randrange(total)
+        for length, weight in enumerate(weights):
+            if pick < weight:
+                return length
+            pick -= weight
+
+    def _dfa_sample(self, length, rng):
+        state = 0
+        chars = []
+        for remaining in range(length - 1, -1, -1):
+            characters, targets, cumulative = self._choice(remaining, state)
+            k = bisect_right(cumulative, rng.randrange(cumulative[-1]))
+            chars.append(characters[k])
+            state = targets[k]
+        return ''.join(chars)
+
+    def _choice(self, remaining, state):
+        # Outgoing characters of a state weighted by how many accepted
+        # strings of `remaining` more characters follow each of them
+        key = (remaining, state)
+        choice = self._choices.get(key)
+        if choice is None:
+            completions = self._completions_for(remaining + 1)[remaining]
+            characters, targets, cumulative = [], [], []
+            total = 0
+            for char, target in sorted(self.parser.transitions[state].items()):
+                if completions[target]:
+                    total += completions[target]
+                    characters.append(char)
+                    targets.append(target)
+                    cumulative.append(total)
+            choice = self._choices[key] = (characters, targets, cumulative)
+        return choice
+
+    def _grammar_sample(self, symbol, length, rng):
+        # Uniform over derivations: productions and length splits are picked
+        # with probability proportional to the derivations they leave
+        out = []
+        stack = [(symbol, length)]
+        while stack:
+            current, size = stack.pop()
+            if current not in self.grammar:
+                out.append(current)
+                continue
+            pick = rng.randrange(self._count(current, size))
+            for index in range(len(self.grammar[current])):
+                weight = self._rest(current, index, 0, size)
+                if pick < weight:
+                    break
+                pick -= weight
+            production = self.grammar[current][index]
+            pieces = []
+            for position, part in enumerate(production):
+                heads = [len(part)] if part not in self.grammar else range(size + 1)
+                for head in heads:
+                    weight = self._count(part, head) * self._rest(current, index, position + 1, size - head) \
+                        if head <= size else 0
+                    if pick < weight:
+                        break
+                    pick -= weight
+                # The remainder of the pick selects among the rest uniformly
+                pick //= self._count(part, head)
+                pieces.append((part, head))
+                size -= head
+            stack.extend(reversed(pieces))
+        return ''.join(out)
+
+    def sample_many(self, count, length=None, seed=None, as_bytes=False):
+        """A list of `count` uniform samples, drawn column by column with numpy
+
+        With as_bytes=True the samples come back as one bytes object of
+        newline-terminated lines instead, ready to be written out as a corpus.
+        """
+        import numpy as np
+
+        symbol = self.parser.start_symbol
+        rng = np.random.default_rng(seed)
+        transitions = self.parser.transitions
+        if transitions is None or any(ord(char) > 255 for row in transitions for char in row):
+            # No byte-level DFA to vectorize over: fall back to the scalar sampler
+            scalar = random.Random(int(rng.integers(1 << 62)))
+            samples = [self.sample(length, symbol, scalar) for _ in range(count)]
+            return ''.join(sample + '\n' for sample in samples).encode('utf-8') if as_bytes else samples
+
+        if length is None:
+            longest = self.max_length(symbol)
+            weights = np.array([float(self.count(symbol, n)) for n in range(longest + 1)])
+            lengths = rng.choice(len(weights), size=count, p=weights / weights.sum())
+        else:
+            if not self.count(symbol, length):
+                raise ValueError(f"'{symbol}' derives no string of length {length}")
+            lengths = np.full(count, length)
+
+        sizes = np.unique(lengths)
+        if len(sizes) == 1:
+            # Fixed-width records: one view converts the whole block
+            size = int(sizes[0])
+            block = self._dfa_sample_block(count, size, rng)
+            if as_bytes:
+                return np.hstack([block, np.full((count, 1), ord('\n'), dtype=np.uint8)]).tobytes()
+            return block.view(f'S{size}').ravel().astype(f'U{size}').tolist() if size else [''] * count
+        result = np.empty(count, dtype=object)
+        for size in sizes:
+            rows = np.flatnonzero(lengths == size)
+            block = self._dfa_sample_block(len(rows), int(size), rng)
+            result[rows] = [record.tobytes().decode('latin-1') for record in block]
+        if as_bytes:
+            return ''.join(sample + '\n' for sample in result).encode('latin-1')
+        return result.tolist()
+
+    def _dfa_sample_block(self, count, length, rng):
+        # Every sample advances one character per step, all samples at once;
+        # each state's choice of character is an alias table, so a draw costs
+        # one bin lookup and one comparison however large the alphabet
+        import numpy as np
+
+        if length == 0:
+            return np.empty((count, 0), dtype=np.uint8)
+        transitions = self.parser.transitions
+        completions = self._completions_for(length)
+        alphabet = sorted({char for row in transitions for char in row})
+        width = len(alphabet)
+        column = {char: k for k, char in enumerate(alphabet)}
+        codes = np.array([ord(char) for char in alphabet], dtype=np.uint8)
+        targets = np.zeros((len(transitions), width), dtype=np.intp)
+        for state, row in enumerate(transitions):
+            for char, target in row.items():
+                targets[state, column[char]] = target
+        targets = targets.ravel()
+
+        states = np.zeros(count, dtype=np.intp)
+        out = np.empty((count, length), dtype=np.uint8)
+        for position in range(length):
+            remaining = completions[length - position - 1]
+            weights = [[0] * width for _ in transitions]
+            for state, row in enumerate(transitions):
+                for char, target in row.items():
+                    weights[state][column[char]] = remaining[target]
+            probability, alias = _alias_tables(weights)
+            scaled = rng.random(count) * width
+            bins = np.minimum(scaled.astype(np.intp), width - 1)
+            cells = states * width + bins
+            picks = np.where(scaled - bins < probability[cells], bins, alias[cells])
+            out[:, position] = codes[picks]
+            states = targets[states * width + picks]
+        return out
+
+    def _uses_dfa(self, symbol):
+        return symbol == self.parser.start_symbol and self.parser.transitions is not None
+
+    def _completions_for(self, length):
+        # _completions[n][q] = accepted strings of exactly n characters from q
+        transitions = self.parser.transitions
+        completions = self._completions
+        if not completions:
+            completions.append([int(state in self.parser.accepting) for state in range(len(transitions))])
+        while len(completions) <= length:
+            previous = completions[-1]
+            completions.append([sum(previous[target] for target in row.values()) for row in transitions])
+        return completions
+
+
+def _alias_tables(weights):
+    """Walker/Vose alias tables for rows of integer weights, flattened for numpy"""
+    import numpy as np
+
+    width = len(weights[0])
+    probability = np.ones(len(weights) * width)
+    alias = np.tile(np.arange(width), len(weights))
+    for state, row in enumerate(weights):
+        total = sum(row)
+        if not total:
+            continue
+        base = state * width
+        scaled = [weight * width / total for weight in row]
+        small = [k for k in range(width) if scaled[k] < 1.0]
+        large = [k for k in range(width) if scaled[k] >= 1.0]
+        while small and large:
+            low = small.pop()
+            high = large[-1]
+            probability[base + low] = scaled[low]
+            alias[base + low] = high
+            scaled[high] -= 1.0 - scaled[low]
+            if scaled[high] < 1.0:
+                small.append(large.pop())
+        # Whatever is left is within rounding of a full bin, except that a
+        # character with no weight must never be picked
+        heaviest = max(range(width), key=row.__getitem__)
+        for k in small + large:
+            if row[k]:
+                probability[base + k] = 1.0
+            else:
+                probability[base + k] = 0.0
+                alias[base + k] = heaviest
+    return probability, alias
@@ -1,12 +1,29 @@
-import customtkinter as ctk
-from cfg_parser import CFGParser
-from custom_scrolled_text import CustomScrolledText
-from App import App
+import sys
+import time
+
+# Taken before the GUI stack is imported, for --measure-startup
+_started = time.perf_counter()
 
 
 def main():
+    measure = '--measure-startup' in sys.argv[1:]
+    
+    import customtkinter as ctk
+    from App import App
+    imported = time.perf_counter()
+    
     root = ctk.CTk()
     app = App(root)
+    
+    if measure:
+        # Process pending events so the first window is actually drawn
+        root.update()
+        shown = time.perf_counter()
+        print(f"imports: {(imported - _started) * 1e3:.1f} ms, "
+              f"first window: {(shown - _started) * 1e3:.1f} ms")
+        root.destroy()
+        return
+    
     root.mainloop()
     
-main()
\ No newline at end of file
+main()
@@ -1,8 +1,107 @@
+from symbols import intern, labels
+
+
 class Node:
-    def __init__(self, value):
-        self.value = value
+    # __slots__ drops the per-instance __dict__; parse trees are built for
+    # every input, so this is most of their memory. Nodes hold the interned
+    # symbol ID; the label is only looked up for display
+    __slots__ = ('symbol', 'children')
+
+    def __init__(self, symbol):
+        self.symbol = symbol if symbol.__class__ is int else intern(symbol)
         self.children = []
 
+    @property
+    def value(self):
+        """The symbol's label"""
+        return labels[self.symbol]
+
     def add_child(self, child_node):
         self.children.append(child_node)
-        return child_node
\ No newline at end of file
+        return child_node
+
+    @staticmethod
+    def leaf(symbol):
+        """Return the shared leaf for a terminal symbol (ID or label)"""
+        if symbol.__class__ is not int:
+            symbol = intern(symbol)
+        leaf = _leaves.get(symbol)
+        if leaf is None:
+            leaf = _leaves[symbol] = Leaf(symbol)
+        return leaf
+
+
+class FrozenNode(Node):
+    """Immutable node whose children are a tuple; safe to share between callers"""
+    __slots__ = ()
+
+    def __init__(self, symbol, children=()):
+        if symbol.__class__ is not int:
+            symbol = intern(symbol)
+        object.__setattr__(self, 'symbol', symbol)
+        object.__setattr__(self, 'children', children)
+
+    def __setattr__(self, name, value):
+        raise AttributeError("frozen nodes are immutable")
+
+    def add_child(self, child_node):
+        raise TypeError("frozen nodes cannot have children added")
+
+
+class Leaf(FrozenNode):
+    """Childless frozen node, shared by every tree (a flyweight)"""
+    __slots__ = ()
+
+    def __init__(self, symbol):
+        super().__init__(symbol)
+
+
+class TreeTable:
+    """Hash-consing table: structurally identical frozen subtrees are built once
+
+    A node is looked up by its structure, (symbol, children), where the
+    children are themselves shared nodes compared by identity, so hashing
+    a node costs O(number of children) however deep it is. Two trees that
+    went through the same table are structurally equal exactly when they
+    are the same object, which lets results such as layouts be cached per
+    tree. Terminal leaves are the Node.leaf flyweights.
+
+    The table is emptied when it reaches maxsize entries; trees handed out
+    earlier stay valid but are no longer shared with later ones.
+    """
+
+    def __init__(self, maxsize=1 << 16):
+        self.maxsize = maxsize
+        self._nodes = {}
+
+    def __len__(self):
+        return len(self._nodes)
+
+    def node(self, symbol, children=()):
+        """The shared node for symbol over a tuple of already shared children"""
+        key = (symbol, children)
+        node = self._nodes.get(key)
+        if node is None:
+            if len(self._nodes) >= self.maxsize:
+                self._nodes.clear()
+            node = self._nodes[key] = FrozenNode(symbol, children)
+        return node
+
+    def share(self, root):
+        """The shared copy of any tree, mutable or frozen"""
+        shared = {}
+        stack = [(root, False)]
+        while stack:
+            node, expanded = stack.pop()
+            if isinstance(node, Leaf):
+                shared[id(node)] = node
+            elif expanded:
+                shared[id(node)] = self.node(node.symbol, tuple(shared[id(child)] for child in node.children))
+            else:
+                stack.append((node, True))
+                stack.extend((child, False) for child in node.children)
+        return shared[id(root)]
+
+
+# One Leaf per terminal symbol ID, created on first use
+_leaves = {}
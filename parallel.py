@@ -0,0 +1,101 @@
+import multiprocessing
+import os
+import time
+from collections import namedtuple
+from cfg_parser import CFGParser
+
+# Per-line result codes stored in the flag bytes returned by the workers
+INVALID = 0
+VALID = 1
+BLANK = 2
+
+# Summary of a parallel run: counts and throughput
+ParallelStats = namedtuple('ParallelStats', ['lines', 'valid', 'invalid', 'bytes', 'seconds',
+                                             'lines_per_second'])
+
+# Each worker process builds its own parser once, in _init_worker
+_worker_parser = None
+
+
+def chunk_offsets(path, chunk_size):
+    """Split path into (start, end) byte ranges that end on line boundaries"""
+    size = os.path.getsize(path)
+    offsets = []
+    with open(path, 'rb') as file:
+        start = 0
+        while start < size:
+            file.seek(min(start + chunk_size, size))
+            if file.tell() < size:
+                file.readline()
+            end = file.tell()
+            offsets.append((start, end))
+            start = end
+    return offsets
+
+
+def split_lines(data):
+    """Decode a chunk of UTF-8 bytes into its lines
+
+    Only '\n' ends a line, as in the serial CLI and the batch panel
+    (str.splitlines would also split on form feeds, U+2028 and others).
+    """
+    lines = data.decode('utf-8', errors='replace').split('\n')
+    if lines and not lines[-1]:
+        lines.pop()
+    return lines
+
+
+def _init_worker(grammar):
+    global _worker_parser
+    _worker_parser = CFGParser(grammar=grammar)
+
+
+def _validate_chunk(task):
+    # Workers receive only (path, start, end) and read the bytes themselves,
+    # so nothing but the compact flag bytes crosses the process boundary
+    path, start, end = task
+    with open(path, 'rb') as file:
+        file.seek(start)
+        data = file.read(end - start)
+
+    validate = _worker_parser.validate_input
+    flags = bytearray()
+    for line in split_lines(data):
+        line = line.strip()
+        if not line:
+            flags.append(BLANK)
+        else:
+            flags.append(VALID if validate(line) else INVALID)
+    return start, end, bytes(flags)
+
+
+def iter_chunk_results(path, jobs=None, chunk_size=4 * 1024 * 1024, grammar=None):
+    """Yield (start, end, flags) per chunk of path, in input order
+
+    flags holds one byte per line of the chunk: VALID, INVALID or BLANK.
+    grammar is a grammar file path or Grammar (the bundled one by default).
+    """
+    tasks = [(path, start, end) for start, end in chunk_offsets(path, chunk_size)]
+    if not tasks:
+        return
+    with multiprocessing.Pool(jobs or os.cpu_count(), initializer=_init_worker, initargs=(grammar,)) as pool:
+        # imap hands results back in submission order while later chunks are
+        # still being validated
+        yield from pool.imap(_validate_chunk, tasks)
+
+
+def validate_file(path, jobs=None, chunk_size=4 * 1024 * 1024, grammar=None):
+    """Validate every line of path in parallel, return (flags, ParallelStats)"""
+    started = time.perf_counter()
+    flags = bytearray()
+    for _, _, chunk_flags in iter_chunk_results(path, jobs, chunk_size, grammar):
+        flags += chunk_flags
+    seconds = time.perf_counter() - started
+    return flags, summarize(flags.count(VALID), flags.count(INVALID), os.path.getsize(path), seconds)
+
+
+def summarize(valid, invalid, byte_count, seconds):
+    """Build ParallelStats from the valid and invalid line counts of a run"""
+    lines = valid + invalid
+    return ParallelStats(lines, valid, invalid, byte_count, seconds,
+                         lines / seconds if seconds > 0 else 0.0)
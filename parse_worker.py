@@ -0,0 +1,60 @@
+import threading
+
+
+class ParseWorker:
+    """Background thread that derives only the most recently submitted input"""
+
+    def __init__(self, parser, on_result):
+        # on_result(generation, input_string, derivation) is called from the
+        # worker thread; the parser must only be used through this worker
+        self.parser = parser
+        self.on_result = on_result
+        self._condition = threading.Condition()
+        self._pending = None  # (generation, input_string) waiting to be parsed
+        self._generation = 0
+        self._stopped = False
+        self._thread = threading.Thread(target=self._run, name="parse-worker", daemon=True)
+        self._thread.start()
+
+    def submit(self, input_string):
+        """Queue input_string, replacing any request not yet started; return its generation"""
+        with self._condition:
+            self._generation += 1
+            self._pending = (self._generation, input_string)
+            self._condition.notify()
+            return self._generation
+
+    def cancel(self):
+        """Drop the pending request and mark any running one as stale"""
+        with self._condition:
+            self._generation += 1
+            self._pending = None
+
+    def is_current(self, generation):
+        return generation == self._generation
+
+    def stop(self):
+        with self._condition:
+            self._stopped = True
+            self._pending = None
+            self._condition.notify()
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while self._pending is None and not self._stopped:
+                    self._condition.wait()
+                if self._stopped:
+                    return
+                generation, input_string = self._pending
+                self._pending = None
+
+            derivation = self.parser.derive(input_string)
+            if derivation.valid:
+                # Materialize both step lists here, off the Tk thread
+                derivation.leftmost
+                derivation.rightmost
+
+            # Results for inputs that were superseded meanwhile are dropped
+            if self.is_current(generation):
+                self.on_result(generation, input_string, derivation)
@@ -0,0 +1,99 @@
+import mmap
+import re
+
+
+class Scanner:
+    """Find every substring accepted by a CFGParser's grammar in UTF-8 bytes"""
+
+    def __init__(self, parser):
+        if parser.transitions is None:
+            raise ValueError("Scanning needs a grammar that compiles into a DFA")
+
+        # Byte-indexed copy of the parser's transition table (None = dead).
+        # A character that takes several bytes in UTF-8 moves through extra
+        # non-accepting states, one per byte; UTF-8 is prefix-free, so these
+        # never collide and a match always starts and ends on a character
+        self.rows = [[None] * 256 for _ in parser.transitions]
+        for state, row in enumerate(parser.transitions):
+            for char, target in row.items():
+                encoded = char.encode('utf-8')
+                current = state
+                for byte in encoded[:-1]:
+                    following = self.rows[current][byte]
+                    if following is None:
+                        following = self.rows[current][byte] = len(self.rows)
+                        self.rows.append([None] * 256)
+                    current = following
+                self.rows[current][encoded[-1]] = target
+        self.accepting = parser.accepting
+
+        # Only runs of bytes that appear somewhere in the table can hold a
+        # match, so the regex engine skips everything else without Python
+        # ever touching those bytes
+        alphabet = sorted({byte for row in self.rows for byte, target in enumerate(row) if target is not None})
+        self.min_length = max(self._shortest_match(), 1)
+        char_class = b''.join(re.escape(bytes([byte])) for byte in alphabet)
+        self.candidates = re.compile(b'[' + char_class + b']{%d,}' % self.min_length)
+
+        # Terminals written directly in the start productions (the date
+        # separators) are reported alongside each match, longest first so
+        # that a separator is never cut short by one of its prefixes
+        self.separators = sorted({symbol for production in parser.get_productions(parser.start_symbol)
+                                  for symbol in production if parser.is_terminal(symbol)},
+                                 key=len, reverse=True)
+
+    def _shortest_match(self):
+        distance = {0: 0}
+        frontier = [0]
+        while frontier:
+            if any(state in self.accepting for state in frontier):
+                return distance[frontier[0]]
+            next_frontier = []
+            for state in frontier:
+                for target in self.rows[state]:
+                    if target is not None and target not in distance:
+                        distance[target] = distance[state] + 1
+                        next_frontier.append(target)
+            frontier = next_frontier
+        return 0
+
+    def scan_buffer(self, buffer, base_offset=0):
+        """Lazily yield (offset, text, separator) for every match in buffer"""
+        rows = self.rows
+        accepting = self.accepting
+        min_length = self.min_length
+        for run in self.candidates.finditer(buffer):
+            run_end = run.end()
+            for start in range(run.start(), run_end - min_length + 1):
+                # Run the recognizer from this offset until it dies or the run ends
+                state = 0
+                position = start
+                while position < run_end:
+                    state = rows[state][buffer[position]]
+                    if state is None:
+                        break
+                    position += 1
+                    if state in accepting:
+                        text = bytes(buffer[start:position]).decode('utf-8')
+                        yield base_offset + start, text, self._separator(text)
+
+    def scan_file(self, path):
+        """Memory-map path and lazily yield its matches with byte offsets"""
+        with open(path, 'rb') as file:
+            try:
+                mapped = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+            except ValueError:
+                # Empty files cannot be mapped and hold no matches
+                return
+        with mapped:
+            if hasattr(mmap, 'MADV_SEQUENTIAL'):
+                mapped.madvise(mmap.MADV_SEQUENTIAL)
+            yield from self.scan_buffer(mapped)
+
+    def _separator(self, text):
+        # The first separator terminal in text, matched whole
+        for position in range(len(text)):
+            for separator in self.separators:
+                if text.startswith(separator, position):
+                    return separator
+        return None
@@ -0,0 +1,285 @@
+"""Newline-delimited JSON server for the parser, over TCP or a Unix socket.
+
+Every request is one JSON object per line and gets one JSON line back:
+
+    {"id": 1, "op": "validate", "input": "05/12/2023"}
+    {"id": 1, "ok": true, "valid": true}
+
+Operations are validate, leftmost, rightmost, tree and stats. Requests on
+a connection may be pipelined; replies carry the request's id and can come
+back out of order. Validation requests from all connections are coalesced
+into micro-batches for CFGParser.validate_many.
+
+    python server.py --port 8765
+    python server.py --unix /tmp/cfg-parser.sock
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from cfg_parser import CFGParser
+from instrumentation import PhaseStats
+
+OPERATIONS = ('validate', 'leftmost', 'rightmost', 'tree', 'stats')
+
+
+class ParseServer:
+    """Serves one parser to many connections, batching validation requests"""
+
+    def __init__(self, parser, batch_size=256, batch_delay=0.002, max_pending=4096, max_in_flight=64):
+        self.parser = parser
+        self.batch_size = batch_size
+        self.batch_delay = batch_delay      # seconds a partial batch waits for company
+        self.max_pending = max_pending      # queued validations before readers are paused
+        self.max_in_flight = max_in_flight  # unanswered requests per connection
+        # The parser is not thread-safe, so all parser work runs on one thread
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='parser')
+        self.latency = PhaseStats(enabled=True)
+        self.counters = {'requests': 0, 'errors': 0, 'connections': 0, 'batches': 0, 'batched': 0}
+        self.started = time.perf_counter()
+        self.server = None
+        self._writers = set()  # open connections, closed by close()
+        self._queue = None
+        self._batcher = None
+        try:
+            import numpy  # noqa: F401 -- validate_many needs it
+            self._vectorized = True
+        except ImportError:
+            self._vectorized = False
+
+    async def start(self, host='127.0.0.1', port=0, path=None):
+        """Listen on host:port (port 0 picks a free one) or on a Unix socket path"""
+        self._queue = asyncio.Queue(self.max_pending)
+        self._batcher = asyncio.ensure_future(self._run_batches())
+        if path is not None:
+            self.server = await asyncio.start_unix_server(self.handle_connection, path)
+        else:
+            self.server = await asyncio.start_server(self.handle_connection, host, port)
+        return self.server
+
+    @property
+    def address(self):
+        return self.server.sockets[0].getsockname() if self.server else None
+
+    async def close(self):
+        if self.server is not None:
+            self.server.close()
+            await self.server.wait_closed()
+        for writer in list(self._writers):
+            writer.close()
+        if self._batcher is not None:
+            self._batcher.cancel()
+        self.executor.shutdown(wait=False)
+
+    async def handle_connection(self, reader, writer):
+        self.counters['connections'] += 1
+        self._writers.add(writer)
+        # Reading stops while max_in_flight requests are unanswered, which
+        # pushes back on the client through the socket's flow control
+        slots = asyncio.Semaphore(self.max_in_flight)
+        tasks = set()
+        try:
+            while True:
+                await slots.acquire()
+                try:
+                    line = await reader.readline()
+                except (ValueError, asyncio.LimitOverrunError):
+                    slots.release()
+                    await self._send(writer, {'ok': False, 'error': 'request line too long'})
+                    break
+                if not line:
+                    slots.release()
+                    break
+                if not line.strip():
+                    slots.release()
+                    continue
+                task = asyncio.ensure_future(self._answer(line, writer, slots))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+            if tasks:
+                await asyncio.gather(*tasks, return_exceptions=True)
+        except (ConnectionError, asyncio.CancelledError):
+            # Client went away, or the server is shutting down
+            pass
+        finally:
+            for task in tasks:
+                task.cancel()
+            self._writers.discard(writer)
+            writer.close()
+
+    async def _answer(self, line, writer, slots):
+        started = time.perf_counter()
+        op = None
+        try:
+            try:
+                request = json.loads(line)
+            except ValueError:
+                reply = {'ok': False, 'error': 'request is not valid JSON'}
+            else:
+                op = request.get('op') if isinstance(request, dict) else None
+                reply = await self._dispatch(request, op)
+                if isinstance(request, dict) and 'id' in request:
+                    reply['id'] = request['id']
+            if not reply['ok']:
+                self.counters['errors'] += 1
+            self.counters['requests'] += 1
+            await self._send(writer, reply)
+            if op in OPERATIONS:
+                self.latency.record(op, time.perf_counter() - started)
+        finally:
+            slots.release()
+
+    async def _dispatch(self, request, op):
+        if op not in OPERATIONS:
+            return {'ok': False, 'error': f"unknown op {op!r}; expected one of {', '.join(OPERATIONS)}"}
+        if op == 'stats':
+            return {'ok': True, 'stats': self.metrics()}
+        text = request.get('input')
+        if not isinstance(text, str):
+            return {'ok': False, 'error': "'input' must be a string"}
+        if op == 'validate':
+            return {'ok': True, 'valid': await self.validate(text)}
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, self._derive, op, text)
+
+    async def _send(self, writer, reply):
+        writer.write(json.dumps(reply, ensure_ascii=False).encode('utf-8') + b'\n')
+        # Waits while the client is slow to read
+        await writer.drain()
+
+    def _derive(self, op, text):
+        # Runs on the parser thread
+        derivation = self.parser.derive(text)
+        if not derivation.valid:
+            return {'ok': True, 'valid': False}
+        if op == 'tree':
+            return {'ok': True, 'valid': True, 'tree': tree_to_dict(derivation.tree)}
+        return {'ok': True, 'valid': True, 'steps': list(getattr(derivation, op))}
+
+    async def validate(self, text):
+        """Queue text for the next validation batch and wait for its answer"""
+        future = asyncio.get_running_loop().create_future()
+        # Waits while the queue is full; once all of a connection's in-flight
+        # slots are waiting here, its reader stops too
+        await self._queue.put((text, future))
+        return await future
+
+    async def _run_batches(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            # Collect whatever else arrives within batch_delay, up to batch_size
+            deadline = loop.time() + self.batch_delay
+            while len(batch) < self.batch_size:
+                if self._queue.empty():
+                    remaining = deadline - loop.time()
+                    if remaining <= 0:
+                        break
+                    try:
+                        batch.append(await asyncio.wait_for(self._queue.get(), remaining))
+                    except asyncio.TimeoutError:
+                        break
+                else:
+                    batch.append(self._queue.get_nowait())
+
+            texts = [text for text, _ in batch]
+            try:
+                results = await loop.run_in_executor(self.executor, self._validate_batch, texts)
+            except Exception as error:
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(error)
+                continue
+            self.counters['batches'] += 1
+            self.counters['batched'] += len(batch)
+            for (_, future), valid in zip(batch, results):
+                if not future.done():
+                    future.set_result(valid)
+
+    def _validate_batch(self, texts):
+        # Runs on the parser thread
+        with self.latency.timer('batch'):
+            if self._vectorized:
+                return self.parser.validate_many(texts).tolist()
+            return [self.parser.validate_input(text) for text in texts]
+
+    def metrics(self):
+        """Request counts, throughput, batching and per-operation latency"""
+        uptime = time.perf_counter() - self.started
+        counters = self.counters
+        return {
+            'uptime_s': uptime,
+            'requests': counters['requests'],
+            'errors': counters['errors'],
+            'requests_per_s': counters['requests'] / uptime if uptime > 0 else 0.0,
+            'connections': counters['connections'],
+            'pending': self._queue.qsize() if self._queue is not None else 0,
+            'batches': counters['batches'],
+            'mean_batch_size': counters['batched'] / counters['batches'] if counters['batches'] else 0.0,
+            'latency_ms': self.latency.snapshot(),
+        }
+
+
+def tree_to_dict(root):
+    """A parse tree as nested {"value": ..., "children": [...]} objects (no recursion)"""
+    result = {'value': root.value, 'children': []}
+    stack = [(root, result)]
+    while stack:
+        node, converted = stack.pop()
+        for child in node.children:
+            entry = {'value': child.value, 'children': []}
+            converted['children'].append(entry)
+            stack.append((child, entry))
+    return result
+
+
+async def serve(args):
+    parser = CFGParser(cache_size=args.cache, grammar=args.grammar)
+    server = ParseServer(parser, batch_size=args.batch_size, batch_delay=args.batch_delay_ms / 1000,
+                         max_pending=args.max_pending, max_in_flight=args.max_in_flight)
+    if args.unix:
+        if os.path.exists(args.unix):
+            os.unlink(args.unix)
+        await server.start(path=args.unix)
+        sys.stderr.write(f"listening on {args.unix}\n")
+    else:
+        await server.start(args.host, args.port)
+        host, port = server.address[:2]
+        sys.stderr.write(f"listening on {host}:{port}\n")
+    sys.stderr.flush()
+    try:
+        await server.server.serve_forever()
+    finally:
+        await server.close()
+        sys.stderr.write(json.dumps(server.metrics(), indent=2) + "\n")
+
+
+def main(argv=None):
+    arg_parser = argparse.ArgumentParser(description="Serve the CFG parser as newline-delimited JSON.")
+    arg_parser.add_argument('--host', default='127.0.0.1', help="address to listen on (default: 127.0.0.1)")
+    arg_parser.add_argument('--port', type=int, default=8765, help="TCP port, 0 for any free one (default: 8765)")
+    arg_parser.add_argument('--unix', default=None, metavar='PATH', help="listen on a Unix socket instead of TCP")
+    arg_parser.add_argument('--grammar', default=None, metavar='FILE',
+                            help="grammar to serve, .bnf or .json (default: the bundled date grammar)")
+    arg_parser.add_argument('--cache', type=int, default=1024, metavar='N',
+                            help="keep the derivations of the N most recent distinct inputs")
+    arg_parser.add_argument('--batch-size', type=int, default=256, help="largest validation batch")
+    arg_parser.add_argument('--batch-delay-ms', type=float, default=2.0,
+                            help="how long a partial batch waits for more requests")
+    arg_parser.add_argument('--max-pending', type=int, default=4096,
+                            help="queued validations before connections stop being read")
+    arg_parser.add_argument('--max-in-flight', type=int, default=64,
+                            help="unanswered requests per connection before it stops being read")
+    args = arg_parser.parse_args(argv)
+    try:
+        asyncio.run(serve(args))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
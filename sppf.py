@@ -0,0 +1,234 @@
+import math
+from node import Node
+
+
+class ParseForest:
+    """Shared packed parse forest (SPPF) of one input, built from an Earley chart
+
+    The forest is binarized. Symbol nodes (A, i, j) say that A derives
+    input[i:j]. Intermediate nodes (A, production index, dot, i, j) say that
+    the first `dot` symbols of a production derive input[i:j]. Every packed
+    family joins such a prefix with the one symbol that follows it. Nodes
+    are O(n^2) and families O(n^3) for any grammar, however many trees the
+    input has, and counting or extracting trees never enumerates the others.
+
+    Families map a node key to a list of packed alternatives. For symbol
+    nodes they are (production index, left, right); for intermediate nodes
+    they are (left, right). left is the intermediate node of the preceding
+    prefix (None when the prefix is empty). right is the span of the last
+    symbol, (symbol, i, j), and is None only for an empty production.
+    """
+
+    def __init__(self, parser, input_string, items, ends):
+        self.parser = parser
+        self.input = input_string
+        self.root = (parser.start_symbol, 0, len(input_string))
+        self.families = {}
+        self._items = items  # items[j]: set of Earley items (lhs, index, dot, origin) in chart[j]
+        self._starts = {}    # (symbol, j) -> every i such that symbol derives input[i:j]
+        for (symbol, i), spans in ends.items():
+            for j in spans:
+                self._starts.setdefault((symbol, j), []).append(i)
+        self._build()
+        self._counts = None
+        self.cyclic = None
+
+    def __len__(self):
+        return len(self.families)
+
+    @property
+    def family_count(self):
+        return sum(len(alternatives) for alternatives in self.families.values())
+
+    @property
+    def ambiguous(self):
+        """True when the input has more than one parse tree"""
+        # Every node is reachable from the root and derives at least one
+        # finite tree, so any choice anywhere means several trees
+        return any(len(alternatives) > 1 for alternatives in self.families.values())
+
+    def _build(self):
+        grammar = self.parser.grammar
+        items = self._items
+        families = self.families
+        pending = [self.root]
+        while pending:
+            key = pending.pop()
+            if key in families:
+                continue
+            if len(key) == 3:
+                lhs, i, j = key
+                alternatives = []
+                for index, production in enumerate(grammar[lhs]):
+                    size = len(production)
+                    if (lhs, index, size, i) not in items[j]:
+                        continue
+                    if size == 0:
+                        alternatives.append((index, None, None))
+                    else:
+                        alternatives.extend((index, left, right)
+                                            for left, right in self._packings(lhs, index, size, i, j))
+            else:
+                alternatives = list(self._packings(*key))
+            families[key] = alternatives
+            for alternative in alternatives:
+                for child in alternative[-2:]:
+                    if child is not None and (len(child) == 5 or child[0] in grammar) and child not in families:
+                        pending.append(child)
+
+    def _packings(self, lhs, index, dot, i, k):
+        # Every (prefix, last symbol) split of production[:dot] over input[i:k]
+        production = self.parser.grammar[lhs][index]
+        symbol = production[dot - 1]
+        if symbol in self.parser.grammar:
+            middles = [m for m in self._starts.get((symbol, k), ()) if m >= i]
+        else:
+            m = k - len(symbol)
+            middles = [m] if m >= i and self.input.startswith(symbol, m) else []
+        for m in middles:
+            if dot == 1:
+                if m == i:
+                    yield None, (symbol, m, k)
+            elif (lhs, index, dot - 1, i) in self._items[m]:
+                yield (lhs, index, dot - 1, i, m), (symbol, m, k)
+
+    def count(self):
+        """Number of parse trees (math.inf when the forest has a cycle)"""
+        counts = self._tree_counts()
+        return math.inf if counts is None else counts[self.root]
+
+    def _tree_counts(self):
+        # Post-order dynamic program over the forest: a node's count is the
+        # sum over its families of the product of their two children's counts.
+        # Meeting a node that is still open means a cycle (A =>+ A), i.e.
+        # infinitely many trees
+        if self.cyclic is not None:
+            return self._counts
+        families = self.families
+        # Terminals and empty prefixes are not forest nodes and count once
+        counts = {}
+        state = {}
+        stack = [(self.root, False)]
+        while stack:
+            key, expanded = stack.pop()
+            if expanded:
+                total = 0
+                for alternative in families[key]:
+                    total += counts.get(alternative[-2], 1) * counts.get(alternative[-1], 1)
+                counts[key] = total
+                state[key] = True
+                continue
+            done = state.get(key)
+            if done:
+                continue
+            if done is False:
+                self.cyclic = True
+                return None
+            state[key] = False
+            stack.append((key, True))
+            for alternative in families[key]:
+                for child in alternative[-2:]:
+                    if child in families and not state.get(child):
+                        stack.append((child, False))
+        self.cyclic = False
+        self._counts = counts
+        return counts
+
+    def tree(self, k=0):
+        """The k-th parse tree (0-based) as Node objects, built without visiting the others"""
+        counts = self._tree_counts()
+        if counts is None:
+            raise ValueError("the forest is cyclic; it has infinitely many trees")
+        if not 0 <= k < counts[self.root]:
+            raise IndexError(f"tree index {k} out of range for {counts[self.root]} trees")
+        grammar = self.parser.grammar
+        root = Node(self.root[0])
+        stack = [(root, self.root, k)]
+        while stack:
+            node, key, k = stack.pop()
+            # Pick the family holding tree k; within it, k is a mixed-radix
+            # number whose low digit selects the last symbol's tree
+            (_, left, right), k = self._select(counts, key, k)
+            if right is None:
+                continue
+            parts = []
+            while True:
+                right_count = counts.get(right, 1)
+                parts.append((right, k % right_count))
+                k //= right_count
+                if left is None:
+                    break
+                (_, left, right), k = self._select(counts, left, k)
+            for child_key, child_k in reversed(parts):
+                if child_key[0] in grammar:
+                    stack.append((node.add_child(Node(child_key[0])), child_key, child_k))
+                else:
+                    node.add_child(Node.leaf(child_key[0]))
+        return root
+
+    def first_tree(self):
+        """Some parse tree as Node objects, in time linear in the forest even when it is cyclic
+
+        Families are settled bottom-up, as in Horn-clause satisfiability: a
+        family is usable once all of its child nodes are settled, and a node
+        is settled by the first family that becomes usable. Settled choices
+        never lead back to an open node, so the tree is finite.
+        """
+        families = self.families
+        chosen = {}
+        waiting = {}  # node -> [unsettled children, node, alternative] of the families that need it
+        ready = []
+        for key, alternatives in families.items():
+            for alternative in alternatives:
+                children = {child for child in alternative[-2:] if child in families}
+                if not children:
+                    ready.append((key, alternative))
+                    continue
+                entry = [len(children), key, alternative]
+                for child in children:
+                    waiting.setdefault(child, []).append(entry)
+        while ready:
+            key, alternative = ready.pop()
+            if key in chosen:
+                continue
+            chosen[key] = alternative
+            for entry in waiting.pop(key, ()):
+                entry[0] -= 1
+                if entry[0] == 0:
+                    ready.append((entry[1], entry[2]))
+
+        grammar = self.parser.grammar
+        root = Node(self.root[0])
+        stack = [(root, self.root)]
+        while stack:
+            node, key = stack.pop()
+            left, right = chosen[key][-2:]
+            parts = []
+            while right is not None:
+                parts.append(right)
+                if left is None:
+                    break
+                left, right = chosen[left]
+            for child_key in reversed(parts):
+                if child_key[0] in grammar:
+                    stack.append((node.add_child(Node(child_key[0])), child_key))
+                else:
+                    node.add_child(Node.leaf(child_key[0]))
+        return root
+
+    def _select(self, counts, key, k):
+        # The family of key that contains tree k, as (production index or
+        # None, left, right), and the index of the tree within that family
+        for alternative in self.families[key]:
+            size = counts.get(alternative[-2], 1) * counts.get(alternative[-1], 1)
+            if k < size:
+                return (alternative if len(alternative) == 3 else (None,) + alternative), k
+            k -= size
+        raise IndexError(k)
+
+    def trees(self):
+        """Lazily yield every parse tree, one at a time"""
+        if self._tree_counts() is None:
+            raise ValueError("the forest is cyclic; it has infinitely many trees")
+        for k in range(self.count()):
+            yield self.tree(k)
@@ -0,0 +1,34 @@
+"""Process-wide symbol interning.
+
+Every grammar symbol (terminal or non-terminal label) is mapped to a small
+int the first time it is seen. Parse trees, derivation steps and the
+parser's own tables hold these IDs; labels are only looked up when a
+result is displayed or exported. IDs are stable for the life of the
+process but not across processes, so they are never written to files.
+"""
+
+# Symbol kinds, as stored in CFGParser.symbol_kinds (0: not in the grammar)
+TERMINAL = 1
+NON_TERMINAL = 2
+
+labels = []  # ID -> label
+_ids = {}    # label -> ID
+
+
+def intern(label):
+    """The ID of label, assigning the next free one on first use"""
+    symbol = _ids.get(label)
+    if symbol is None:
+        symbol = _ids[label] = len(labels)
+        labels.append(label)
+    return symbol
+
+
+def lookup(label):
+    """The ID of label, or None if it was never interned"""
+    return _ids.get(label)
+
+
+def text(symbols):
+    """The labels of a sequence of IDs run together, e.g. a sentential form"""
+    return ''.join(map(labels.__getitem__, symbols))
@@ -0,0 +1,246 @@
+from bisect import bisect_left, bisect_right
+from collections import OrderedDict
+from node import FrozenNode
+
+
+class Layout:
+    """Node positions of a laid-out tree plus a row index for viewport queries"""
+
+    def __init__(self, nodes, edges, depths, node_radius, level_height):
+        self.nodes = nodes  # (node, x, y) in preorder
+        self.edges = edges  # (parent index, child index) in preorder of the child
+        self.node_radius = node_radius
+        self.level_height = level_height
+        self.width = max(x for _, x, _ in nodes) + node_radius
+        self.height = max(y for _, _, y in nodes) + node_radius
+
+        # rows[d] lists the nodes at depth d from left to right. Edges between
+        # two levels of a tidy tree never cross, so both ends of row d's edges
+        # grow left to right too and any x-range maps onto a slice of them
+        self.rows = []
+        for index, depth in enumerate(depths):
+            while len(self.rows) <= depth:
+                self.rows.append(([], []))
+            xs, indices = self.rows[depth]
+            xs.append(nodes[index][1])
+            indices.append(index)
+
+        self.edge_rows = [([], [], []) for _ in self.rows]
+        for parent_index, child_index in sorted(edges, key=lambda edge: nodes[edge[1]][1]):
+            low, high, children = self.edge_rows[depths[parent_index]]
+            parent_x = nodes[parent_index][1]
+            child_x = nodes[child_index][1]
+            low.append(min(parent_x, child_x))
+            high.append(max(parent_x, child_x))
+            children.append(child_index)
+
+    def _depth_range(self, y0, y1):
+        # Rows whose circles (centred at depth * level_height + radius) meet [y0, y1]
+        first = max(0, -int((2 * self.node_radius - y0) // self.level_height))
+        last = min(len(self.rows) - 1, int(y1 // self.level_height))
+        return range(first, last + 1)
+
+    def nodes_in(self, x0, y0, x1, y1):
+        """Preorder indices of the nodes whose circle meets the rectangle"""
+        r = self.node_radius
+        found = []
+        for depth in self._depth_range(y0, y1):
+            xs, indices = self.rows[depth]
+            found.extend(indices[bisect_left(xs, x0 - r):bisect_right(xs, x1 + r)])
+        return found
+
+    def edges_in(self, x0, y0, x1, y1):
+        """Child indices of the edges whose bounding box meets the rectangle"""
+        found = []
+        for depth in self._depth_range(y0 - self.level_height, y1):
+            low, high, children = self.edge_rows[depth]
+            found.extend(children[bisect_left(high, x0):bisect_right(low, x1)])
+        return found
+
+
+class LayoutCache:
+    """Bounded LRU map from a frozen tree and its spacing to its Layout
+
+    Trees are keyed by identity. CFGParser.derive hash-conses its trees
+    (see node.TreeTable), so a tree shown on several canvases, or derived
+    again later, is the same object and is laid out once. Layouts are
+    never modified after they are built, so canvases can share them.
+    Mutable trees could change after being laid out and are not cached.
+    """
+
+    def __init__(self, maxsize=32):
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def layout(self, root, node_radius=20, level_height=60, horizontal_spacing=30):
+        if not isinstance(root, FrozenNode):
+            return compute_layout(root, node_radius, level_height, horizontal_spacing)
+        key = (root, node_radius, level_height, horizontal_spacing)
+        layout = self._entries.get(key)
+        if layout is not None:
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return layout
+        self.misses += 1
+        layout = self._entries[key] = compute_layout(root, node_radius, level_height, horizontal_spacing)
+        if len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+        return layout
+
+
+# Used by every TreeVisualizer unless it is given its own
+shared_layouts = LayoutCache()
+
+
+def compute_layout(root, node_radius=20, level_height=60, horizontal_spacing=30):
+    """Lay out a tree with the Buchheim/Walker tidy-tree algorithm in linear time
+
+    Sibling subtrees are packed as close as their contours allow, parents sit
+    centred over their children, and every walk uses an explicit stack so
+    deep trees never hit the recursion limit.
+    """
+    distance = 2 * node_radius + horizontal_spacing
+
+    # Flatten the tree into preorder arrays
+    nodes = []
+    children = []
+    parent = []
+    depths = []
+    number = []  # position among siblings
+    stack = [(root, -1, 0, 0)]
+    while stack:
+        node, parent_index, depth, sibling_number = stack.pop()
+        index = len(nodes)
+        nodes.append(node)
+        children.append([])
+        parent.append(parent_index)
+        depths.append(depth)
+        number.append(sibling_number)
+        if parent_index >= 0:
+            children[parent_index].append(index)
+        for i in range(len(node.children) - 1, -1, -1):
+            stack.append((node.children[i], index, depth + 1, i))
+
+    count = len(nodes)
+    prelim = [0.0] * count
+    mod = [0.0] * count
+    shift = [0.0] * count
+    change = [0.0] * count
+    thread = [-1] * count
+    ancestor = list(range(count))
+    default_ancestor = [kids[0] if kids else -1 for kids in children]
+
+    def left_sibling(v):
+        return children[parent[v]][number[v] - 1] if number[v] > 0 else -1
+
+    def next_left(v):
+        return children[v][0] if children[v] else thread[v]
+
+    def next_right(v):
+        return children[v][-1] if children[v] else thread[v]
+
+    def move_subtree(left, right, amount):
+        subtrees = number[right] - number[left]
+        change[right] -= amount / subtrees
+        shift[right] += amount
+        change[left] += amount / subtrees
+        prelim[right] += amount
+        mod[right] += amount
+
+    def apportion(v):
+        # Push v's subtree right until it clears the contours of its left siblings
+        w = left_sibling(v)
+        if w < 0:
+            return
+        p = parent[v]
+        inner_right = outer_right = v
+        inner_left = w
+        outer_left = children[p][0]
+        shift_ir = mod[inner_right]
+        shift_or = mod[outer_right]
+        shift_il = mod[inner_left]
+        shift_ol = mod[outer_left]
+        while next_right(inner_left) >= 0 and next_left(inner_right) >= 0:
+            inner_left = next_right(inner_left)
+            inner_right = next_left(inner_right)
+            outer_left = next_left(outer_left)
+            outer_right = next_right(outer_right)
+            ancestor[outer_right] = v
+            gap = (prelim[inner_left] + shift_il) - (prelim[inner_right] + shift_ir) + distance
+            if gap > 0:
+                greatest = ancestor[inner_left]
+                if parent[greatest] != p:
+                    greatest = default_ancestor[p]
+                move_subtree(greatest, v, gap)
+                shift_ir += gap
+                shift_or += gap
+            shift_il += mod[inner_left]
+            shift_ir += mod[inner_right]
+            shift_ol += mod[outer_left]
+            shift_or += mod[outer_right]
+        if next_right(inner_left) >= 0 and next_right(outer_right) < 0:
+            thread[outer_right] = next_right(inner_left)
+            mod[outer_right] += shift_il - shift_or
+        if next_left(inner_right) >= 0 and next_left(outer_left) < 0:
+            thread[outer_left] = next_left(inner_right)
+            mod[outer_left] += shift_ir - shift_ol
+            default_ancestor[p] = v
+
+    # First walk, in post-order: children are finished (and apportioned
+    # against their left siblings) before their parent is placed
+    for v in _postorder(children):
+        kids = children[v]
+        w = left_sibling(v)
+        if kids:
+            # Execute the shifts accumulated by move_subtree
+            total_shift = 0.0
+            total_change = 0.0
+            for child in reversed(kids):
+                prelim[child] += total_shift
+                mod[child] += total_shift
+                total_change += change[child]
+                total_shift += shift[child] + total_change
+            midpoint = (prelim[kids[0]] + prelim[kids[-1]]) / 2
+            if w >= 0:
+                prelim[v] = prelim[w] + distance
+                mod[v] = prelim[v] - midpoint
+            else:
+                prelim[v] = midpoint
+        elif w >= 0:
+            prelim[v] = prelim[w] + distance
+        if parent[v] >= 0:
+            apportion(v)
+
+    # Second walk, in pre-order: sum the modifiers down each path
+    xs = [0.0] * count
+    stack = [(0, 0.0)]
+    while stack:
+        v, modifier = stack.pop()
+        xs[v] = prelim[v] + modifier
+        for child in children[v]:
+            stack.append((child, modifier + mod[v]))
+
+    # Shift everything so that the leftmost node touches the margin
+    offset = node_radius - min(xs)
+    positioned = [(nodes[v], xs[v] + offset, depths[v] * level_height + node_radius) for v in range(count)]
+    edges = [(parent[v], v) for v in range(1, count)]
+    return Layout(positioned, edges, depths, node_radius, level_height)
+
+
+def _postorder(children):
+    # Iterative post-order over preorder-indexed child lists (root is 0)
+    order = []
+    stack = [0]
+    while stack:
+        v = stack.pop()
+        order.append(v)
+        stack.extend(children[v])
+    # Reversing a root-first walk that visits children right to left gives a
+    # post-order that visits siblings left to right
+    order.reverse()
+    return order
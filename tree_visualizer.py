@@ -1,6 +1,9 @@
 import customtkinter as ctk
 import tkinter as tk
 from node import Node
+from tree_layout import shared_layouts
+from instrumentation import PhaseStats
+from symbols import NON_TERMINAL, TERMINAL
 
 class TreeVisualizer(ctk.CTkCanvas):
     def __init__(self, master, **kwargs):
@@ -8,107 +11,149 @@ class TreeVisualizer(ctk.CTkCanvas):
         self.node_radius = 20
         self.level_height = 60
         self.horizontal_spacing = 30
-        self.nodes = {}  # Store node objects and their coordinates
-        self.node_colors = {
-            # Non-terminals in blue 
-            'S': '#3498db',
-            'M': '#2980b9',
-            'D': '#2980b9',
-            'Y': '#2980b9',
-            'P': '#2980b9',
-            'N': '#2980b9',
-            'X': '#2980b9',
-            'V': '#2980b9',
-            'Z': '#2980b9',
-            # Terminals in green 
-            '0': '#2ecc71',
-            '1': '#2ecc71',
-            '2': '#2ecc71',
-            '3': '#2ecc71',
-            '4': '#2ecc71',
-            '5': '#2ecc71',
-            '6': '#2ecc71',
-            '7': '#2ecc71',
-            '8': '#2ecc71',
-            '9': '#2ecc71',
-            '/': '#2ecc71',
-            '-': '#2ecc71',
-            '.': '#2ecc71'
-        }
+        # Largest size the canvas asks for; bigger trees are scrolled
+        self.max_view_width = 1400
+        self.max_view_height = 800
+        self.layout = None
+        # Layouts are shared with every other canvas showing the same tree
+        self.layouts = shared_layouts
+        self.nodes = []  # Store node objects and their coordinates
+        self.edges = []
+        # Canvas items kept between draws, keyed by preorder position:
+        # (oval id, text id, symbol ID, color, x, y) per node and
+        # (line id, coords) per edge (edges are keyed by their child node).
+        # Only positions in or near the visible region have items at all
+        self.node_items = {}
+        self.edge_items = {}
+        self.canvas_size = None
+        # Layout and drawing timings; App swaps in its shared, enabled stats
+        self.stats = PhaseStats()
+        self.bind("<Configure>", lambda event: self._refresh_viewport())
+        # Nodes are coloured by symbol kind, looked up by symbol ID in the
+        # parser's symbol_kinds table (App hands it over); the root is lighter
+        self.symbol_kinds = None
+        self.root_color = '#3498db'
+        self.kind_colors = {NON_TERMINAL: '#2980b9', TERMINAL: '#2ecc71'}
+        self.default_color = '#95a5a6'
         
     def draw_tree(self, root):
-        """Draw the parse tree on the canvas"""
-        self.delete("all")  # Clear canvas
-        self.nodes = {}
-        
-        # Calculate the width needed
-        self._calculate_node_positions(root, 0, 0)
+        """Draw the parse tree, reusing the canvas items of the previous draw"""
+        # Positions are stored per tree position (preorder index), not per
+        # node object, because terminal leaves are shared between positions
+        with self.stats.timer('layout'):
+            self.layout = self.layouts.layout(root, self.node_radius, self.level_height, self.horizontal_spacing)
+        self.nodes = self.layout.nodes  # (node, x, y) in preorder
+        self.edges = self.layout.edges  # (parent index, child index)
         
         # Adjust canvas size based on node positions
-        max_x = max([pos[0] for pos in self.nodes.values()]) + self.node_radius + 20
-        max_y = max([pos[1] for pos in self.nodes.values()]) + self.node_radius + 20
-        
-        self.configure(width=max_x, height=max_y, scrollregion=(0, 0, max_x, max_y))
+        max_x = self.layout.width + 20
+        max_y = self.layout.height + 20
         
-        # Draw connections first (so they appear behind nodes)
-        self._draw_connections(root)
+        if self.canvas_size != (max_x, max_y):
+            self.canvas_size = (max_x, max_y)
+            self.configure(width=min(max_x, self.max_view_width), height=min(max_y, self.max_view_height),
+                           scrollregion=(0, 0, max_x, max_y))
         
-        # Draw nodes
-        self._draw_nodes()
+        self._refresh_viewport()
     
-    def _calculate_node_positions(self, node, level, x_offset):
-        """Calculate positions for all nodes in the tree"""
-        if not node.children:
-            # This is a leaf node
-            node_width = self.node_radius * 2 + self.horizontal_spacing
-            self.nodes[node] = (x_offset + self.node_radius, level * self.level_height + self.node_radius)
-            return node_width
-        
-        # Calculate width for this subtree
-        total_width = 0
-        for child in node.children:
-            child_width = self._calculate_node_positions(child, level + 1, x_offset + total_width)
-            total_width += child_width
-        
-        # Position this node at the center of its children
-        first_child_x = self.nodes[node.children[0]][0]
-        last_child_x = self.nodes[node.children[-1]][0]
-        center_x = (first_child_x + last_child_x) / 2
+    def xview(self, *args):
+        result = super().xview(*args)
+        if args:
+            self._refresh_viewport()
+        return result
+    
+    def yview(self, *args):
+        result = super().yview(*args)
+        if args:
+            self._refresh_viewport()
+        return result
+    
+    def _refresh_viewport(self):
+        """Bring the canvas items in line with the part of the tree in view"""
+        if self.layout is None:
+            return
+        with self.stats.timer('draw'):
+            self._update_items()
+    
+    def _update_items(self):
+        # Visible region in canvas coordinates, padded by half a screen on
+        # each side so that small scrolls do not create items at the edge
+        width = max(self.winfo_width(), self.winfo_reqwidth())
+        height = max(self.winfo_height(), self.winfo_reqheight())
+        x0 = self.canvasx(0) - width / 2
+        y0 = self.canvasy(0) - height / 2
+        x1 = x0 + 2 * width
+        y1 = y0 + 2 * height
         
-        self.nodes[node] = (center_x, level * self.level_height + self.node_radius)
+        # Update connections first (new ones are lowered behind the nodes)
+        self._draw_connections(self.layout.edges_in(x0, y0, x1, y1))
         
-        return total_width
+        # Update nodes
+        self._draw_nodes(self.layout.nodes_in(x0, y0, x1, y1))
+    
+    def node_color(self, index, node):
+        if index == 0:
+            return self.root_color
+        kinds = self.symbol_kinds
+        if kinds is None or node.symbol >= len(kinds):
+            return self.default_color
+        return self.kind_colors.get(kinds[node.symbol], self.default_color)
     
-    def _draw_nodes(self):
-        """Draw all nodes on the canvas"""
-        for node, (x, y) in self.nodes.items():
-            # Get color based on node type
-            color = self.node_colors.get(node.value, '#95a5a6')  # Default gray
+    def _draw_nodes(self, visible):
+        """Create, update or delete node items so they match the visible nodes"""
+        r = self.node_radius
+        for index in visible:
+            node, x, y = self.nodes[index]
+            color = self.node_color(index, node)
             
-            # Draw node circle
-            self.create_oval(
-                x - self.node_radius, y - self.node_radius, 
-                x + self.node_radius, y + self.node_radius, 
-                fill=color, outline='black'
-            )
+            item = self.node_items.get(index)
+            if item is None:
+                # New position: draw node circle and text
+                oval = self.create_oval(x - r, y - r, x + r, y + r, fill=color, outline='black', tags='node')
+                text = self.create_text(x, y, text=node.value, fill='white', font=('Arial', 12, 'bold'),
+                                        tags='node')
+                self.node_items[index] = (oval, text, node.symbol, color, x, y)
+                continue
             
-            # Draw node text
-            self.create_text(x, y, text=node.value, fill='white', font=('Arial', 12, 'bold'))
+            # Existing position: only touch what actually changed
+            oval, text, symbol, old_color, old_x, old_y = item
+            if (x, y) != (old_x, old_y):
+                self.coords(oval, x - r, y - r, x + r, y + r)
+                self.coords(text, x, y)
+            if color != old_color:
+                self.itemconfigure(oval, fill=color)
+            if node.symbol != symbol:
+                self.itemconfigure(text, text=node.value)
+            self.node_items[index] = (oval, text, node.symbol, color, x, y)
+        
+        # Positions that scrolled out of range or no longer exist in the tree
+        visible = set(visible)
+        for index in [index for index in self.node_items if index not in visible]:
+            oval, text, *_ = self.node_items.pop(index)
+            self.delete(oval, text)
     
-    def _draw_connections(self, node):
-        """Draw connections between nodes"""
-        if not node.children:
-            return
+    def _draw_connections(self, visible):
+        """Create, update or delete connection lines so they match the visible edges"""
+        created = False
+        for child_index in visible:
+            parent_index = self.edges[child_index - 1][0]
+            _, parent_x, parent_y = self.nodes[parent_index]
+            _, child_x, child_y = self.nodes[child_index]
+            coords = (parent_x, parent_y + self.node_radius, child_x, child_y - self.node_radius)
             
-        parent_x, parent_y = self.nodes[node]
+            item = self.edge_items.get(child_index)
+            if item is None:
+                # Draw line from parent to child
+                line = self.create_line(*coords, fill='black', width=2, tags='edge')
+                self.edge_items[child_index] = (line, coords)
+                created = True
+            elif item[1] != coords:
+                self.coords(item[0], *coords)
+                self.edge_items[child_index] = (item[0], coords)
         
-        for child in node.children:
-            child_x, child_y = self.nodes[child]
-            
-            # Draw line from parent to child
-            self.create_line(parent_x, parent_y + self.node_radius, 
-                        child_x, child_y - self.node_radius,
-                        fill='black', width=2)
-            
-            # Recursive call for child's connections
-            self._draw_connections(child)
\ No newline at end of file
+        visible = set(visible)
+        for child_index in [index for index in self.edge_items if index not in visible]:
+            self.delete(self.edge_items.pop(child_index)[0])
+        
+        if created:
+            self.tag_lower('edge')
\ No newline at end of file